@@ -17,14 +17,15 @@ import random
 import math
 import bmesh
 import json
+import zlib
 import pathlib
-import statistics
 import sys
 import os
 import numpy as np
 from bpy.app.handlers import persistent
-from collections import Counter
 from mathutils import Vector
+from mathutils.bvhtree import BVHTree
+from mathutils.interpolate import poly_3d_calc
 
 
 # ------------------------------------------------------------------------
@@ -48,16 +49,91 @@ class SXTOOLS_sxglobals(object):
         self.modeID = None
 
         self.prevSelection = []
-        self.prevComponentSelection = []
+        self.prevComponentSelection = None
+        # Set by depsgraph and msgbus notifications,
+        # the selection monitor only inspects selections when set
+        self.selectionDirty = True
+        self.msgbusOwner = object()
+        # Objects and meshes written by SX Tools since the last
+        # depsgraph update, their geometry updates are not user edits
+        self.pendingWrites = set()
+        # Bumped with selectionDirty, keys the validated
+        # object list shared by all draw code in a redraw
+        self.selectionGeneration = 0
+        self.selectionContext = {'key': None, 'objs': []}
+
+        # Parent to children, rebuilt in one pass after
+        # objects are added, removed or reparented
+        self.hierarchyIndex = None
+
+        # Per-object positions in obj.sxlayers by layer index, name
+        # and export data, and default colors by layer index
+        self.layerMaps = {}
+        self.layerDefaults = None
+
+        # Refresh work requested by property updates,
+        # merged and run once per scheduler tick
+        self.refreshQueue = {'scheduled': False, 'actives': False, 'composite': False, 'tasks': {}}
+        self.refreshInterval = 0.05
         self.rampDict = {}
         self.categoryDict = {}
         self.presetLookup = {}
         self.paletteDict = {}
+
+        # Enum items built from the libraries, rebuilt
+        # when a library is loaded or saved
+        self.libraryVersion = 0
+        self.enumCache = {}
+
+        # Parsed library files keyed by mode, valid while path,
+        # mtime and size match, and retry backoff after failed loads
+        self.libraryCache = {}
+        self.libraryRetry = {'failures': 0, 'next': 0.0}
+
+        # Parsed asset catalogue and its normalized file path
+        # to (category, key) index, valid while mtime and size match
+        self.catalogueCache = {'key': None, 'data': None, 'index': None}
+        # Catalogue lock wait and staleness in seconds, and the
+        # token written into each lock this session holds
+        self.catalogueLockTimeout = 5.0
+        self.catalogueLockStale = 30.0
+        self.catalogueLocks = {}
         self.masterPaletteArray = []
         self.materialArray = []
 
         self.randomseed = 42
 
+        # Baked, unique and mirror-reused vertex counts for bake reporting
+        self.bakeVertexCount = 0
+        self.bakeUniqueCount = 0
+        self.bakeMirrorCount = 0
+
+        # Layer data versions bumped by set_layer,
+        # and cached partial composites per object
+        self.layerVersion = 0
+        self.layerVersions = {}
+        self.compositeCache = {}
+
+        # Number of objects kept in the composite cache,
+        # least recently composited objects are evicted first
+        self.compositeCacheLimit = 64
+
+        # Buffers for compositing multiple objects in one pass,
+        # released after each pass, and the loop count a batch may hold
+        self.batchBuffers = None
+        self.batchLoopBudget = 1000000
+
+        # Last debug shading result per object
+        self.debugCache = {}
+
+        # Color layers as uint8 palette indices and color tables,
+        # keyed by object and layer index, verified against the layer data
+        self.paletteIndexCache = {}
+
+        # Layer undo steps, each holding compressed before-snapshots
+        # and XOR deltas to the after-state of the touched layer data
+        self.undoJournal = {'undo': [], 'redo': [], 'size': 0, 'step': None, 'suspended': False, 'recording': False}
+
         # name, enabled, index, layerType (COLOR/UV/UV4),
         # defaultColor, defaultValue,
         # visibility, alpha, blendMode, vertexColorLayer,
@@ -138,29 +214,31 @@ class SXTOOLS_files(object):
         prefs = bpy.context.preferences.addons['sxtools'].preferences
         directory = prefs.libraryfolder
         filePath = directory + mode + '.json'
+        changed = False
 
         if len(directory) > 0:
             try:
-                with open(filePath, 'r') as input:
-                    tempDict = {}
-                    tempDict = json.load(input)
-                    if mode == 'palettes':
-                        del sxglobals.masterPaletteArray[:]
-                        bpy.context.scene.sxpalettes.clear()
-                        sxglobals.masterPaletteArray = tempDict['Palettes']
-                    elif mode == 'materials':
-                        del sxglobals.materialArray[:]
-                        bpy.context.scene.sxmaterials.clear()
-                        sxglobals.materialArray = tempDict['Materials']
-                    elif mode == 'gradients':
-                        sxglobals.rampDict.clear()
-                        sxglobals.rampDict = tempDict
-                    elif mode == 'categories':
-                        sxglobals.categoryDict.clear()
-                        sxglobals.categoryDict = tempDict
-
-                    input.close()
-                print(f'SX Tools: {mode} loaded from {filePath}')
+                stat = os.stat(filePath)
+                fileKey = (filePath, stat.st_mtime_ns, stat.st_size)
+                cached = sxglobals.libraryCache.get(mode)
+                if (cached is not None) and (cached[0] == fileKey):
+                    tempDict = cached[1]
+                else:
+                    with open(filePath, 'r') as input:
+                        tempDict = json.load(input)
+                        input.close()
+                    sxglobals.libraryCache[mode] = (fileKey, tempDict)
+                    changed = True
+                    print(f'SX Tools: {mode} loaded from {filePath}')
+
+                if mode == 'palettes':
+                    sxglobals.masterPaletteArray = tempDict['Palettes']
+                elif mode == 'materials':
+                    sxglobals.materialArray = tempDict['Materials']
+                elif mode == 'gradients':
+                    sxglobals.rampDict = tempDict
+                elif mode == 'categories':
+                    sxglobals.categoryDict = tempDict
             except ValueError:
                 print(f'SX Tools Error: Invalid {mode} file.')
                 prefs.libraryfolder = ''
@@ -173,13 +251,13 @@ class SXTOOLS_files(object):
             return False
 
         if mode == 'palettes':
-            self.load_swatches(sxglobals.masterPaletteArray)
-            return True
+            changed = self.load_swatches(sxglobals.masterPaletteArray) or changed
         elif mode == 'materials':
-            self.load_swatches(sxglobals.materialArray)
-            return True
-        else:
-            return True
+            changed = self.load_swatches(sxglobals.materialArray) or changed
+
+        if changed:
+            self.library_changed()
+        return True
 
 
     def save_file(self, mode):
@@ -202,7 +280,11 @@ class SXTOOLS_files(object):
                     tempDict = {}
                     tempDict = sxglobals.rampDict
                     json.dump(tempDict, output, indent=4)
+                elif mode == 'categories':
+                    json.dump(sxglobals.categoryDict, output, indent=4)
                 output.close()
+            sxglobals.libraryCache.pop(mode, None)
+            self.library_changed()
             message_box(mode + ' saved')
             # print('SX Tools: ' + mode + ' saved')
         else:
@@ -210,6 +292,11 @@ class SXTOOLS_files(object):
             # print('SX Tools Warning: ' + mode + ' file location not set!')
 
 
+    def library_changed(self):
+        sxglobals.libraryVersion += 1
+        sxglobals.enumCache.clear()
+
+
     def load_swatches(self, swatcharray):
         if swatcharray == sxglobals.materialArray:
             swatchcount = 3
@@ -218,26 +305,51 @@ class SXTOOLS_files(object):
             swatchcount = 5
             sxlist = bpy.context.scene.sxpalettes
 
+        names = []
+        categories = []
+        colors = []
         for categoryDict in swatcharray:
             for category in categoryDict:
                 if len(categoryDict[category]) == 0:
-                    item = sxlist.add()
-                    item.name = 'Empty'
-                    item.category = category
-                    for i in range(swatchcount):
-                        incolor = [0.0, 0.0, 0.0, 1.0]
-                        setattr(item, 'color'+str(i), incolor[:])
+                    names.append('Empty')
+                    categories.append(category)
+                    colors.append([[0.0, 0.0, 0.0]] * swatchcount)
                 else:
                     for entry in categoryDict[category]:
-                        item = sxlist.add()
-                        item.name = entry
-                        item.category = category
-                        for i in range(swatchcount):
-                            incolor = [0.0, 0.0, 0.0, 1.0]
-                            incolor[0] = categoryDict[category][entry][i][0]
-                            incolor[1] = categoryDict[category][entry][i][1]
-                            incolor[2] = categoryDict[category][entry][i][2]
-                            setattr(item, 'color'+str(i), convert.srgb_to_linear(incolor))
+                        names.append(entry)
+                        categories.append(category)
+                        colors.append([categoryDict[category][entry][i][:3] for i in range(swatchcount)])
+
+        count = len(names)
+        swatchColors = np.ones((count, swatchcount, 4), dtype=np.float32)
+        if count > 0:
+            swatchColors[:, :, :3] = convert.srgb_to_linear_array(np.array(colors, dtype=float))
+
+        # Resize the collection in place and only
+        # write the names and colors that differ
+        changed = len(sxlist) != count
+        while len(sxlist) > count:
+            sxlist.remove(len(sxlist) - 1)
+        while len(sxlist) < count:
+            sxlist.add()
+
+        for item, name, category in zip(sxlist, names, categories):
+            if item.name != name:
+                item.name = name
+                changed = True
+            if item.category != category:
+                item.category = category
+                changed = True
+
+        current = np.empty(count * 4, dtype=np.float32)
+        for i in range(swatchcount):
+            target = swatchColors[:, i, :].ravel()
+            sxlist.foreach_get('color'+str(i), current)
+            if not np.array_equal(current, target):
+                sxlist.foreach_set('color'+str(i), target)
+                changed = True
+
+        return changed
 
 
     def save_ramp(self, rampName):
@@ -387,6 +499,147 @@ class SXTOOLS_files(object):
                 print(f'Completed: {group_name}')
 
 
+# ------------------------------------------------------------------------
+#    Asset Catalogue
+# ------------------------------------------------------------------------
+class SXTOOLS_catalogue(object):
+    def __init__(self):
+        return None
+
+
+    # Resolves symlinks and aliases like os.path.samefile would
+    def normalize(self, path):
+        return os.path.normcase(os.path.realpath(path))
+
+
+    # Catalogue keys are relative to the catalogue folder
+    # and use '//' as a platform-independent separator
+    def entry_key(self, catalogue_path, file_path):
+        asset_path = os.path.split(catalogue_path)[0]
+        return os.path.relpath(file_path, asset_path).replace(os.path.sep, '//')
+
+
+    def build_index(self, catalogue_path, data):
+        asset_path = os.path.split(catalogue_path)[0]
+        index = {}
+        for category in data:
+            for key in data[category]:
+                key_path = self.normalize(os.path.join(asset_path, key.replace('//', os.path.sep)))
+                index.setdefault(key_path, []).append((category, key))
+        return index
+
+
+    # Raises ValueError or IOError like json.load and open,
+    # fresh skips the mtime check for reads under the lock
+    def load(self, catalogue_path, fresh=False):
+        stat = os.stat(catalogue_path)
+        fileKey = (self.normalize(catalogue_path), stat.st_mtime_ns, stat.st_size)
+        cache = sxglobals.catalogueCache
+        if fresh or (cache['key'] != fileKey):
+            with open(catalogue_path, 'r') as input:
+                data = json.load(input)
+                input.close()
+            cache['key'] = fileKey
+            cache['data'] = data
+            cache['index'] = self.build_index(catalogue_path, data)
+        return cache['data'], cache['index']
+
+
+    def entries(self, catalogue_path, file_path):
+        data, index = self.load(catalogue_path)
+        return index.get(self.normalize(file_path), [])
+
+
+    # Advisory lock shared by all writers of the catalogue,
+    # locks left behind by crashed sessions expire
+    # A stale lock is claimed by renaming it, which only one session
+    # can do. A lock renewed since the staleness check is put back,
+    # and a new lock is only ever taken with an exclusive create.
+    def lock(self, catalogue_path):
+        lock_path = catalogue_path + '.lock'
+        token = str(os.getpid()) + '-' + str(time.time_ns())
+        deadline = time.time() + sxglobals.catalogueLockTimeout
+        while True:
+            try:
+                handle = os.open(lock_path, os.O_CREAT | os.O_EXCL | os.O_WRONLY)
+                os.write(handle, token.encode())
+                os.close(handle)
+                sxglobals.catalogueLocks[lock_path] = token
+                return True
+            except FileExistsError:
+                try:
+                    if time.time() - os.path.getmtime(lock_path) > sxglobals.catalogueLockStale:
+                        stale_path = lock_path + '.' + token + '.stale'
+                        os.rename(lock_path, stale_path)
+                        if time.time() - os.path.getmtime(stale_path) <= sxglobals.catalogueLockStale:
+                            try:
+                                os.link(stale_path, lock_path)
+                            except OSError:
+                                pass
+                        os.remove(stale_path)
+                        continue
+                except OSError:
+                    continue
+            if time.time() > deadline:
+                return False
+            time.sleep(0.05)
+
+
+    # Only removes the lock if it still carries this session's token
+    def unlock(self, catalogue_path):
+        lock_path = catalogue_path + '.lock'
+        token = sxglobals.catalogueLocks.pop(lock_path, None)
+        try:
+            with open(lock_path, 'r') as lock_file:
+                owned = lock_file.read() == token
+            if owned:
+                os.remove(lock_path)
+        except OSError:
+            pass
+
+
+    def write(self, catalogue_path, data):
+        temp_path = catalogue_path + '.' + str(os.getpid()) + '.tmp'
+        try:
+            with open(temp_path, 'w') as output:
+                json.dump(data, output, indent=4)
+                output.flush()
+                os.fsync(output.fileno())
+            os.replace(temp_path, catalogue_path)
+        except OSError:
+            sxglobals.catalogueCache['key'] = None
+            if os.path.isfile(temp_path):
+                os.remove(temp_path)
+            raise
+
+        stat = os.stat(catalogue_path)
+        cache = sxglobals.catalogueCache
+        cache['key'] = (self.normalize(catalogue_path), stat.st_mtime_ns, stat.st_size)
+        cache['data'] = data
+        cache['index'] = self.build_index(catalogue_path, data)
+
+
+    # Applies modify(data, index) to a fresh read from disk under the lock,
+    # the mtime check could miss a same-size write by another session.
+    # Writes the result only if modify reports a change,
+    # returns None if the lock could not be acquired.
+    def update(self, catalogue_path, modify):
+        if not self.lock(catalogue_path):
+            return None
+        try:
+            data, index = self.load(catalogue_path, fresh=True)
+            changed = modify(data, index)
+            if changed:
+                self.write(catalogue_path, data)
+            return changed
+        finally:
+            self.unlock(catalogue_path)
+
+
+    def __del__(self):
+        print('SX Tools: Exiting catalogue')
+
+
 # ------------------------------------------------------------------------
 #    Useful Miscellaneous Functions
 # ------------------------------------------------------------------------
@@ -412,37 +665,105 @@ class SXTOOLS_utils(object):
                 sxglobals.modeID = None
 
 
+    # One pass over all objects, ARMATURE children are
+    # also listed under the armature's parent.
+    # Object count guards against additions within an operator.
+    def hierarchy_index(self):
+        index = sxglobals.hierarchyIndex
+        if (index is None) or (index['count'] != len(bpy.data.objects)):
+            children = {}
+            groups = {}
+            for obj in bpy.data.objects:
+                parent = obj.parent
+                grandparent = None
+                if parent is not None:
+                    grandparent = parent.parent
+                    children.setdefault(parent, []).append(obj)
+                    if (parent.type == 'ARMATURE') and (parent.parent is not None):
+                        children.setdefault(parent.parent, []).append(obj)
+                groups[obj] = (parent, grandparent, self.object_groups(obj))
+
+            index = {'count': len(bpy.data.objects), 'children': children, 'groups': groups}
+            sxglobals.hierarchyIndex = index
+        return index
+
+
+    def clear_hierarchy_index(self):
+        sxglobals.hierarchyIndex = None
+
+
+    # Reparenting within an operator happens before the
+    # depsgraph handler can invalidate the index
+    def set_parent(self, obj, parent):
+        obj.parent = parent
+        self.clear_hierarchy_index()
+
+
+    # Indexed children are checked against their parent links,
+    # objects removed or reparented since indexing force a rebuild
+    def indexed_children(self, parent):
+        for i in range(2):
+            children = self.hierarchy_index()['children'].get(parent, [])
+            try:
+                if all([(child.parent == parent) or ((child.parent.type == 'ARMATURE') and (child.parent.parent == parent)) for child in children]):
+                    return children
+            except (ReferenceError, AttributeError):
+                pass
+            self.clear_hierarchy_index()
+        return children
+
+
+    def object_groups(self, obj):
+        parent = obj.parent
+        objGroups = []
+        if (obj.type == 'EMPTY') and (parent is None):
+            objGroups.append(obj)
+
+        if parent is not None:
+            if (parent.type == 'EMPTY') and (parent.parent is None):
+                objGroups.append(parent)
+            elif (parent.type == 'ARMATURE') and (parent.parent is not None) and (parent.parent.type == 'EMPTY'):
+                objGroups.append(parent.parent)
+        return objGroups
+
+
+    # Indexed groups are checked against the parent and grandparent
+    # they were indexed with, stale entries force a rebuild
+    def indexed_groups(self, obj):
+        for i in range(2):
+            entry = self.hierarchy_index()['groups'].get(obj)
+            try:
+                if entry is not None:
+                    parent, grandparent, objGroups = entry
+                    if (obj.parent == parent) and ((parent is None) or (parent.parent == grandparent)):
+                        return objGroups
+            except ReferenceError:
+                pass
+            self.clear_hierarchy_index()
+        return self.object_groups(obj)
+
+
     # Finds groups to be exported,
     # only EMPTY objects with no parents
     # treat ARMATURE objects as a special case
     def find_groups(self, objs, all_groups=False):
-        groups = []
+        groups = set()
         if all_groups:
             objs = bpy.context.view_layer.objects
 
         for obj in objs:
-            if (obj.type == 'EMPTY') and (obj.parent is None):
-                groups.append(obj)
-
-            parent = obj.parent
-            if (parent is not None) and (parent.type == 'EMPTY') and (parent.parent is None):
-                groups.append(obj.parent)
-            elif (parent is not None) and (parent.type == 'ARMATURE') and (parent.parent is not None) and (parent.parent.type == 'EMPTY'):
-                groups.append(parent.parent)
+            groups.update(self.indexed_groups(obj))
 
-        return list(set(groups))
+        return list(groups)
 
 
     # ARMATUREs check for grandparent
     def find_children(self, group, objs=None, recursive=False):
         def get_children(parent):
-            children = []
-            for child in objs:
-                if child.parent == parent:
-                    children.append(child)
-                elif (child.parent is not None) and (child.parent.type == 'ARMATURE') and (child.parent.parent == parent):
-                    children.append(child)
-            return children
+            children = self.indexed_children(parent)
+            if objSet is not None:
+                children = [child for child in children if child in objSet]
+            return children[:]
 
         def child_recurse(children):
             for child in children:
@@ -452,8 +773,9 @@ class SXTOOLS_utils(object):
                     child_recurse(child_list)
 
         results = []
-        if objs is None:
-            objs = bpy.data.objects.values()
+        objSet = None
+        if objs is not None:
+            objSet = set(objs)
 
         if recursive:
             child_list = [group, ]
@@ -464,7 +786,7 @@ class SXTOOLS_utils(object):
 
 
     def find_list_index(self, obj, layer):
-        index = obj.sxlayers[layer.name].index
+        index = self.find_layer_from_name(obj, layer.name).index
 
         return sxglobals.listIndices[index]
 
@@ -481,70 +803,27 @@ class SXTOOLS_utils(object):
 
 
     def find_default_color(self, obj, layer):
-        idx = layer.index
+        if sxglobals.layerDefaults is None:
+            sxglobals.layerDefaults = {value_array[2]: value_array[4] for value_array in sxglobals.layerInitArray}
 
-        for value_array in sxglobals.layerInitArray:
-            if value_array[2] == idx:
-                return value_array[4]
+        return sxglobals.layerDefaults.get(layer.index)
 
 
     def find_default_values(self, obj, mode):
-        sxLayerArray = []
         valueArray = []
         valueDict = {}
-        for sxLayer in obj.sxlayers:
-            if (sxLayer.layerType == 'UV') or (sxLayer.layerType == 'UV4'):
-                sxLayerArray.append(sxLayer)
-
-        nameArray = []
-        for sxLayer in sxLayerArray:
-            nameArray.extend((sxLayer.uvLayer0, sxLayer.uvLayer1, sxLayer.uvLayer2, sxLayer.uvLayer3))
-        nameSet = set(nameArray)
-
-        empty = False
-        for name in nameSet:
-            if name == '':
-                empty = True
-        if empty:
-            nameSet.remove('')
-        uvSets = sorted(nameSet)
+        uvSets = sorted(set([key[0] for key in self.layer_maps(obj)['export'] if isinstance(key, tuple)]))
 
         for uvSet in uvSets:
             values = [uvSet, None, None]
-            for sxLayer in obj.sxlayers:
-                if sxLayer.layerType == 'UV4':
-                    if sxLayer.uvLayer0 == uvSet:
-                        values[1] = sxLayer.defaultColor[0]
-                    if sxLayer.uvLayer1 == uvSet:
-                        values[2] = sxLayer.defaultColor[1]
-                    if sxLayer.uvLayer2 == uvSet:
-                        values[1] = sxLayer.defaultColor[2]
-                    if sxLayer.uvLayer3 == uvSet:
-                        values[2] = sxLayer.defaultColor[3]
+            for channel, slot in (('U', 1), ('V', 2)):
+                sxLayer = self.find_layer_from_export_data(obj, (uvSet, channel))
+                if sxLayer is None:
+                    continue
+                elif sxLayer.layerType == 'UV4':
+                    values[slot] = sxLayer.defaultColor[self.layer_export_data(sxLayer).index((uvSet, channel))]
                 else:
-                    if sxLayer.uvLayer0 == uvSet:
-                        if sxLayer.uvChannel0 == 'U':
-                            values[1] = sxLayer.defaultValue
-                        else:
-                            values[2] = sxLayer.defaultValue
-
-                    if sxLayer.uvLayer1 == uvSet:
-                        if sxLayer.uvChannel1 == 'U':
-                            values[1] = sxLayer.defaultValue
-                        else:
-                            values[2] = sxLayer.defaultValue
-
-                    if sxLayer.uvLayer2 == uvSet:
-                        if sxLayer.uvChannel2 == 'U':
-                            values[1] = sxLayer.defaultValue
-                        else:
-                            values[2] = sxLayer.defaultValue
-
-                    if sxLayer.uvLayer3 == uvSet:
-                        if sxLayer.uvChannel3 == 'U':
-                            values[1] = sxLayer.defaultValue
-                        else:
-                            values[2] = sxLayer.defaultValue
+                    values[slot] = sxLayer.defaultValue
 
             valueDict[uvSet] = (values[1], values[2])
             valueArray.append(values)
@@ -555,6 +834,14 @@ class SXTOOLS_utils(object):
             return valueDict
 
 
+    # LOD bake transfer is the optional 13th value of a category in categories.json
+    def category_lod_transfer(self, category):
+        for name, categoryData in sxglobals.categoryDict.items():
+            if name.replace(" ", "_").upper() == category:
+                return (len(categoryData) > 12) and bool(categoryData[12])
+        return False
+
+
     def find_comp_layers(self, obj, staticExport=True):
         compLayers = []
         for sxLayer in obj.sxlayers:
@@ -572,29 +859,124 @@ class SXTOOLS_utils(object):
         return compLayers
 
 
+    # Stores positions instead of layer references,
+    # which do not survive changes to the collection
+    # Export data is a vertex color layer name or (UV set, channel) pairs
+    def layer_export_data(self, sxLayer):
+        if sxLayer.layerType == 'COLOR':
+            return [sxLayer.vertexColorLayer, ]
+        else:
+            uvSlots = ((sxLayer.uvLayer0, sxLayer.uvChannel0), (sxLayer.uvLayer1, sxLayer.uvChannel1), (sxLayer.uvLayer2, sxLayer.uvChannel2), (sxLayer.uvLayer3, sxLayer.uvChannel3))
+            return [uvSlot for uvSlot in uvSlots if uvSlot[0] != '']
+
+
+    def layer_maps(self, obj):
+        maps = sxglobals.layerMaps.get(obj.name)
+        if (maps is None) or (maps['count'] != len(obj.sxlayers)):
+            maps = {'count': len(obj.sxlayers), 'index': {}, 'name': {}, 'export': {}}
+            for i, sxLayer in enumerate(obj.sxlayers):
+                maps['index'][sxLayer.index] = i
+                maps['name'][sxLayer.name] = i
+                for exportData in self.layer_export_data(sxLayer):
+                    maps['export'].setdefault(exportData, i)
+            sxglobals.layerMaps[obj.name] = maps
+        return maps
+
+
+    def clear_layer_maps(self, objs=None):
+        if objs is None:
+            sxglobals.layerMaps.clear()
+        else:
+            for obj in objs:
+                sxglobals.layerMaps.pop(obj.name, None)
+
+
+    # Looks up a layer position from the maps. A miss or a slot that no
+    # longer matches rebuilds the maps once, as names may have changed
+    def find_layer_position(self, obj, mapname, key, match):
+        maps = self.layer_maps(obj)
+        position = maps[mapname].get(key)
+        if (position is not None) and match(obj.sxlayers[position]):
+            return position
+
+        self.clear_layer_maps([obj, ])
+        return self.layer_maps(obj)[mapname].get(key)
+
+
     def find_layer_from_index(self, obj, index):
-        for sxLayer in obj.sxlayers:
-            if sxLayer.index == index:
-                return sxLayer
+        position = self.find_layer_position(obj, 'index', index, lambda sxLayer: sxLayer.index == index)
+        if position is not None:
+            return obj.sxlayers[position]
+
+
+    def find_layer_from_name(self, obj, name):
+        position = self.find_layer_position(obj, 'name', name, lambda sxLayer: sxLayer.name == name)
+        if position is not None:
+            return obj.sxlayers[position]
 
 
+    def find_layer_from_export_data(self, obj, exportdata):
+        position = self.find_layer_position(obj, 'export', exportdata, lambda sxLayer: exportdata in self.layer_export_data(sxLayer))
+        if position is not None:
+            return obj.sxlayers[position]
+
+
+    # Colors are counted from palette indices where the layer has few colors
+    # and any mask is binary, ties are ordered by first occurrence
     def find_colors_by_frequency(self, objs, layer, numcolors=None, masklayer=None, obj_sel_override=False):
-        colorArray = []
+        colorCounts = {}
+        offset = 0
 
         for obj in objs:
-            if obj_sel_override:
-                values = layers.get_layer(obj, layer, as_tuple=True)
+            count = len(obj.data.loops)
+            indexed = layers.get_layer_indices(obj, layer)
+            mask = None
+            empty = False
+            if (indexed is not None) and not obj_sel_override:
+                if masklayer is not None:
+                    mask, empty = layers.get_layer_mask(obj, masklayer)
+                elif sxglobals.mode != 'OBJECT':
+                    mask, empty = generate.selection_mask(obj)
+                if mask is not None:
+                    mask = np.array(mask, dtype=np.float32)
+                    if not ((mask == 0.0) | (mask == 1.0)).all():
+                        indexed = None
+
+            if empty:
+                pass
+            elif indexed is not None:
+                if mask is None:
+                    positions = np.arange(count)
+                else:
+                    positions = np.flatnonzero(mask)
+                selected = indexed['indices'][positions]
+                counts = np.bincount(selected, minlength=len(indexed['table']))
+                first = np.full(len(counts), count)
+                np.minimum.at(first, selected, positions)
+                for i in np.flatnonzero(counts):
+                    color = tuple(indexed['table'][i].tolist())
+                    if color[3] != 0.0:
+                        entry = colorCounts.setdefault(color, [0, offset + first[i]])
+                        entry[0] += int(counts[i])
+                        entry[1] = min(entry[1], offset + first[i])
             else:
-                values = generate.mask_list(obj, layers.get_layer(obj, layer), masklayer=masklayer, as_tuple=True)
+                if obj_sel_override:
+                    values = layers.get_layer(obj, layer, as_tuple=True)
+                else:
+                    values = generate.mask_list(obj, layers.get_layer(obj, layer), masklayer=masklayer, as_tuple=True)
+
+                if values is not None:
+                    for i, color in enumerate(values):
+                        if color[3] != 0.0:
+                            entry = colorCounts.setdefault(color, [0, offset + i])
+                            entry[0] += 1
 
-            if values is not None:
-                colorArray.extend(values)
+            offset += count
 
-        # colors = list(filter(lambda a: a != (0.0, 0.0, 0.0, 0.0), colorArray))
-        colors = list(filter(lambda a: a[3] != 0.0, colorArray))
-        sortList = [color for color, count in Counter(colors).most_common(numcolors)]
+        sortList = [color for color, entry in sorted(colorCounts.items(), key=lambda item: (-item[1][0], item[1][1]))]
 
         if numcolors is not None:
+            sortList = sortList[:numcolors]
             while len(sortList) < numcolors:
                 sortList.append([0.0, 0.0, 0.0, 1.0])
 
@@ -724,47 +1106,45 @@ class SXTOOLS_utils(object):
         bias = 0.0001
 
         mesh = obj.data
-        bm = bmesh.new()
-        bm.from_mesh(mesh)
-
-        max_distances = []
-
-        for vert in bm.verts:
-            vert_loc = vert.co
-            inv_normal = -1.0 * vert.normal.normalized()
-            bias_vec = inv_normal * bias
-            ray_origin = (vert_loc[0] + bias_vec[0], vert_loc[1] + bias_vec[1], vert_loc[2] + bias_vec[2])
+        count = len(mesh.vertices)
+        if count == 0:
+            return 0.0
 
-            hit, loc, normal, index = obj.ray_cast(ray_origin, inv_normal)
+        co = np.empty(count * 3, dtype=float)
+        normals = np.empty(count * 3, dtype=float)
+        mesh.vertices.foreach_get('co', co)
+        mesh.vertices.foreach_get('normal', normals)
+        co = co.reshape(-1, 3)
+        inv_normals = -normals.reshape(-1, 3)
+        inv_normals /= np.maximum(np.linalg.norm(inv_normals, axis=1), 1e-12)[:, None]
 
-            if hit:
-                dist = Vector((loc[0] - vert_loc[0], loc[1] - vert_loc[1], loc[2] - vert_loc[2])).length
-                if dist > 0.0:
-                    max_distances.append(dist)
+        edg = bpy.context.evaluated_depsgraph_get()
+        bvh = BVHTree.FromObject(obj, edg)
+        # One inward ray per vertex, distances measured from the unbiased vertex position
+        distances = generate.ray_batch(bvh, co + inv_normals * bias, inv_normals, [(0.0, 0.0, 1.0), ])[:, 0] + bias
 
-        bm.free
-        return min(max_distances)
+        distances = distances[np.isfinite(distances) & (distances > 0.0)]
+        if len(distances) == 0:
+            return 0.0
+        return float(distances.min())
 
 
+    # Parents are processed before their children,
+    # ordered once by depth within the given objects
     def clear_parent_inverse_matrix(self, objs):
-        active = bpy.context.view_layer.objects.active
-        mtx_dict = {}
-        for obj in objs:
-            bpy.context.view_layer.objects.active = obj
-            mtx_dict[obj] = obj.matrix_world.copy()
+        mtx_dict = {obj: obj.matrix_world.copy() for obj in objs}
+        objSet = set(objs)
+        depths = {}
 
-        task_list = objs[:]
-        while len(task_list) > 0:
-            for obj in objs:
-                if (obj.parent not in task_list) and (obj in task_list):
-                    bpy.context.view_layer.objects.active = obj
-                    obj.matrix_parent_inverse.identity()
-                    obj.matrix_world = mtx_dict[obj]
-                    task_list.remove(obj)
-                    if len(task_list) == 0:
-                        break
+        def depth(obj):
+            if obj not in depths:
+                parent = obj.parent
+                depths[obj] = 0 if parent not in objSet else depth(parent) + 1
+            return depths[obj]
 
-        bpy.context.view_layer.objects.active = active
+        for obj in sorted(objs, key=depth):
+            obj.matrix_parent_inverse.identity()
+            obj.matrix_world = mtx_dict[obj]
 
 
     def __del__(self):
@@ -838,6 +1218,8 @@ class SXTOOLS_setup(object):
                 item.uvChannel3 = values[17]
                 item.locked = values[18]
 
+        utils.clear_layer_maps(objs)
+
 
     def setup_geometry(self, objs):
         changed = False
@@ -902,16 +1284,19 @@ class SXTOOLS_setup(object):
                     clearSets.append(uvSet)
                     changed = True
 
+                # Clear each referencing layer once,
+                # writing each shared UV map once
                 if len(clearSets) > 0:
-                    for uvSet in clearSets:
-                        for sxLayer in obj.sxlayers:
-                            if ((sxLayer.layerType == 'UV') or
-                               (sxLayer.layerType == 'UV4')):
-                                if ((sxLayer.uvLayer0 == uvSet) or
-                                   (sxLayer.uvLayer1 == uvSet) or
-                                   (sxLayer.uvLayer2 == uvSet) or
-                                   (sxLayer.uvLayer3 == uvSet)):
-                                    layers.clear_layers([obj, ], sxLayer)
+                    clearLayers = []
+                    for sxLayer in obj.sxlayers:
+                        if ((sxLayer.layerType == 'UV') or
+                           (sxLayer.layerType == 'UV4')):
+                            if ((sxLayer.uvLayer0 in clearSets) or
+                               (sxLayer.uvLayer1 in clearSets) or
+                               (sxLayer.uvLayer2 in clearSets) or
+                               (sxLayer.uvLayer3 in clearSets)):
+                                clearLayers.append(sxLayer)
+                    layers.clear_uv_layers(obj, clearLayers)
 
             obj.active_material = bpy.data.materials['SXMaterial']
 
@@ -1701,6 +2086,11 @@ class SXTOOLS_convert(object):
         return out_rgba
 
 
+    def srgb_to_linear_array(self, in_rgb):
+        rgb = np.clip(in_rgb, 0.0, 1.0)
+        return np.where(rgb <= 0.0404482362771082, rgb / 12.92, ((rgb + 0.055) / 1.055) ** 2.4)
+
+
     def linear_to_srgb(self, in_rgba):
         out_rgba = []
         for i in range(3):
@@ -1994,80 +2384,114 @@ class SXTOOLS_generate(object):
         return groundPlane, mesh
 
 
-    def thickness_list(self, obj, raycount, masklayer=None):
-
-        def dist_hit(vert_id, loc, vertPos, dist_list):
-            distanceVec = Vector((loc[0] - vertPos[0], loc[1] - vertPos[1], loc[2] - vertPos[2]))
-            dist_list.append(distanceVec.length)
-
-        def thick_hit(vert_id, loc, vertPos, dist_list):
-            vert_occ_dict[vert_id] += contribution
+    # Tangent frame around each normal for orienting hemisphere samples
+    def hemisphere_basis(self, normals):
+        helper = np.zeros_like(normals)
+        helper[:, 0] = 1.0
+        helper[np.abs(normals[:, 0]) > 0.9] = (0.0, 1.0, 0.0)
+        tangents = np.cross(helper, normals)
+        tangents /= np.maximum(np.linalg.norm(tangents, axis=1), 1e-12)[:, None]
+        bitangents = np.cross(normals, tangents)
+        return tangents, bitangents
+
+
+    # Casts the hemisphere samples (raycount, 3), oriented around each normal,
+    # from every origin against a BVH. Directions are built per chunk of origins
+    # to bound memory. Returns hit distances shaped (origins, raycount) with inf for misses
+    def ray_batch(self, bvh, origins, normals, hemisphere, raydistance=1.70141e+38, chunksize=256):
+        hemisphere = np.asarray(hemisphere, dtype=float).reshape(-1, 3)
+        count = len(origins)
+        distances = np.full((count, len(hemisphere)), np.inf)
+        tangents, bitangents = self.hemisphere_basis(normals)
+        ray_cast = bvh.ray_cast
+
+        for start in range(0, count, chunksize):
+            end = min(start + chunksize, count)
+            directions = (hemisphere[None, :, 0, None] * tangents[start:end, None, :] +
+                          hemisphere[None, :, 1, None] * bitangents[start:end, None, :] +
+                          hemisphere[None, :, 2, None] * normals[start:end, None, :])
+
+            for i in range(start, end):
+                origin = Vector(origins[i])
+                row = distances[i]
+                for j, direction in enumerate(directions[i - start]):
+                    dist = ray_cast(origin, direction, raydistance)[3]
+                    if dist is not None:
+                        row[j] = dist
+
+        return distances
 
-        def ray_caster(obj, raycount, vert_dict, hitfunction, raydistance=1.70141e+38):
-            hemiSphere = self.ray_randomizer(raycount)
 
-            for vert_id in vert_dict:
-                vert_occ_dict[vert_id] = 0.0
-                vertLoc = Vector(vert_dict[vert_id][0])
-                vertNormal = Vector(vert_dict[vert_id][1])
-                bias = 0.001
+    def thickness_list(self, obj, raycount, masklayer=None):
+        vert_dict = self.vertex_data_dict(obj, masklayer)
 
-                # Invert normal to cast inside object
-                invNormal = tuple([-1*x for x in vertNormal])
+        if len(vert_dict.keys()) > 0:
+            for modifier in obj.modifiers:
+                if modifier.type == 'SUBSURF':
+                    modifier.show_viewport = False
 
-                # Raycast for bias
-                hit, loc, normal, index = obj.ray_cast(vertLoc, invNormal, distance=raydistance)
-                if hit and (normal.dot(invNormal) < 0):
-                    hit_dist = Vector((loc[0] - vertLoc[0], loc[1] - vertLoc[1], loc[2] - vertLoc[2])).length
-                    if hit_dist < 0.5:
-                        bias += hit_dist
+            try:
+                edg = bpy.context.evaluated_depsgraph_get()
+                bvh = BVHTree.FromObject(obj, edg)
 
-                biasVec = tuple([bias*x for x in invNormal])
-                rotQuat = forward.rotation_difference(invNormal)
+                vert_ids = list(vert_dict.keys())
+                co = np.array([vert_dict[vert_id][0] for vert_id in vert_ids])
 
-                # offset ray origin with normal bias
-                vertPos = (vertLoc[0] + biasVec[0], vertLoc[1] + biasVec[1], vertLoc[2] + biasVec[2])
+                # Invert normals to cast inside object
+                inv_normals = -np.array([vert_dict[vert_id][1] for vert_id in vert_ids])
 
-                for sample in hemiSphere:
-                    sample = Vector(sample)
-                    sample.rotate(rotQuat)
+                # Raycast for bias, shared by both passes
+                bias = np.full(len(vert_ids), 0.001)
+                for i, (origin, inv_normal) in enumerate(zip(co.tolist(), inv_normals.tolist())):
+                    loc, normal, index, dist = bvh.ray_cast(origin, inv_normal)
+                    if (loc is not None) and (normal.dot(inv_normal) < 0) and (dist < 0.5):
+                        bias[i] += dist
 
-                    hit, loc, normal, index = obj.ray_cast(vertPos, sample, distance=raydistance)
+                # offset ray origins with normal bias
+                origins = co + inv_normals * bias[:, None]
 
-                    if hit:
-                        hitfunction(vert_id, loc, vertPos, dist_list)
+                # First pass to analyze ray hit distances,
+                # then set max ray distance to half of median distance
+                distances = self.ray_batch(bvh, origins, inv_normals, self.ray_randomizer(20))
+                hit_distances = distances[np.isfinite(distances)]
 
-        contribution = 1.0/float(raycount)
-        forward = Vector((0.0, 0.0, 1.0))
+                if len(hit_distances) > 0:
+                    distance = float(np.median(hit_distances)) * 0.5
 
-        dist_list = []
-        vert_occ_dict = {}
-        vert_dict = self.vertex_data_dict(obj, masklayer)
+                    # Second pass for final results
+                    distances = self.ray_batch(bvh, origins, inv_normals, self.ray_randomizer(raycount), raydistance=distance)
+                    values = np.count_nonzero(np.isfinite(distances), axis=1) / float(raycount)
+                else:
+                    values = np.zeros(len(vert_ids))
 
-        if len(vert_dict.keys()) > 0:
-            for modifier in obj.modifiers:
-                if modifier.type == 'SUBSURF':
-                    modifier.show_viewport = False
+            finally:
+                for modifier in obj.modifiers:
+                    if modifier.type == 'SUBSURF':
+                        modifier.show_viewport = obj.sxtools.modifiervisibility
 
-            # First pass to analyze ray hit distances,
-            # then set max ray distance to half of median distance
-            ray_caster(obj, 20, vert_dict, dist_hit)
-            distance = statistics.median(dist_list) * 0.5
+            vert_occ_dict = dict(zip(vert_ids, values.tolist()))
+            vert_occ_list = generate.vert_dict_to_loop_list(obj, vert_occ_dict, 1, 4)
+            return self.mask_list(obj, vert_occ_list, masklayer)
+        else:
+            return None
 
-            # Second pass for final results
-            ray_caster(obj, raycount, vert_dict, thick_hit, raydistance=distance)
 
-            for modifier in obj.modifiers:
-                if modifier.type == 'SUBSURF':
-                    modifier.show_viewport = obj.sxtools.modifiervisibility
+    def occlusion_list(self, obj, raycount=500, blend=0.5, dist=10.0, groundplane=False, masklayer=None):
+        vert_occ_dict = None
+        for done, total, vert_occ_dict in self.occlusion_steps(obj, raycount, blend, dist, groundplane, masklayer):
+            pass
 
+        if vert_occ_dict is not None:
             vert_occ_list = generate.vert_dict_to_loop_list(obj, vert_occ_dict, 1, 4)
             return self.mask_list(obj, vert_occ_list, masklayer)
         else:
             return None
 
 
-    def occlusion_list(self, obj, raycount=500, blend=0.5, dist=10.0, groundplane=False, masklayer=None):
+    # Generator yielding (done, total, vert_occ_dict) after every chunk of
+    # chunksize vertices and once more when finished. Closing it early
+    # removes the temporary ground plane and restores the tiling state.
+    def occlusion_steps(self, obj, raycount=500, blend=0.5, dist=10.0, groundplane=False, masklayer=None, chunksize=0):
         scene = bpy.context.scene
         contribution = 1.0/float(raycount)
         hemiSphere = self.ray_randomizer(raycount)
@@ -2091,115 +2515,197 @@ class SXTOOLS_generate(object):
 
         if len(vert_dict.keys()) > 0:
 
+            # The ground plane only exists while a chunk is traced,
+            # so it never stays in the scene between progressive steps
+            ground = None
             if groundplane:
                 pivot = utils.find_root_pivot([obj, ])
                 pivot = (pivot[0], pivot[1], -0.5)  # pivot[2] - 0.5)
-                ground, groundmesh = self.ground_plane(20, pivot)
 
-            for vert_id in vert_dict:
-                bias = 0.001
-                occValue = 1.0
-                scnOccValue = 1.0
-                vertLoc = Vector(vert_dict[vert_id][0])
-                vertNormal = Vector(vert_dict[vert_id][1])
-                vertWorldLoc = Vector(vert_dict[vert_id][2])
-                vertWorldNormal = Vector(vert_dict[vert_id][3])
-
-                # use modified tile-border normals to reduce seam artifacts
-                # if vertex pos x y z is at bbx limit, and mirror axis is set, modify respective normal vector component to zero
-                if obj.sxtools.tiling:
-                    mod_normal = [0.0, 0.0, 0.0]
-                    match = False
-
-                    for i, coord in enumerate(vertLoc):
-                        if i == 0:
-                            if obj.sxtools.tile_neg_x and (round(coord, 2) == round(xmin, 2)):
-                                match = True
-                                mod_normal[i] = 0.0
-                            elif obj.sxtools.tile_pos_x and (round(coord, 2) == round(xmax, 2)):
-                                match = True
-                                mod_normal[i] = 0.0
-                            else:
-                                mod_normal[i] = vertNormal[i]
-                        elif i == 1:
-                            if obj.sxtools.tile_neg_y and (round(coord, 2) == round(ymin, 2)):
-                                match = True
-                                mod_normal[i] = 0.0
-                            elif obj.sxtools.tile_pos_y and (round(coord, 2) == round(ymax, 2)):
-                                match = True
-                                mod_normal[i] = 0.0
-                            else:
-                                mod_normal[i] = vertNormal[i]
-                        else:
-                            if obj.sxtools.tile_neg_z and (round(coord, 2) == round(zmin, 2)):
-                                match = True
-                                mod_normal[i] = 0.0
-                            elif obj.sxtools.tile_pos_z and (round(coord, 2) == round(zmax, 2)):
-                                match = True
-                                mod_normal[i] = 0.0
+            # Coincident vertices with matching normals are baked once
+            duplicate_dict = self.duplicate_vertex_dict(vert_dict)
+            unique_dict = {vert_id: vert_dict[vert_id] for vert_id in vert_dict if vert_id not in duplicate_dict}
+            sxglobals.bakeVertexCount += len(vert_dict)
+            sxglobals.bakeUniqueCount += len(unique_dict)
+
+            # Mirrored halves get identical local occlusion,
+            # bake canonical vertices first and reuse their results for partners
+            partner_dict = {}
+            local_occ_dict = {}
+            vert_ids = list(unique_dict.keys())
+            if obj.sxtools.mirrorocclusion and not obj.sxtools.tiling:
+                partner_dict = self.mirror_partner_dict(obj, unique_dict)
+                vert_ids.sort(key=lambda vert_id: vert_id in partner_dict)
+                sxglobals.bakeMirrorCount += len(partner_dict)
+
+            try:
+                for n, vert_id in enumerate(vert_ids):
+                    if groundplane and (ground is None):
+                        ground, groundmesh = self.ground_plane(20, pivot)
+                        edg = bpy.context.evaluated_depsgraph_get()
+                        obj_eval = obj.evaluated_get(edg)
+
+                    bias = 0.001
+                    occValue = 1.0
+                    scnOccValue = 1.0
+                    vertLoc = Vector(vert_dict[vert_id][0])
+                    vertNormal = Vector(vert_dict[vert_id][1])
+                    vertWorldLoc = Vector(vert_dict[vert_id][2])
+                    vertWorldNormal = Vector(vert_dict[vert_id][3])
+
+                    # use modified tile-border normals to reduce seam artifacts
+                    # if vertex pos x y z is at bbx limit, and mirror axis is set, modify respective normal vector component to zero
+                    if obj.sxtools.tiling:
+                        mod_normal = [0.0, 0.0, 0.0]
+                        match = False
+
+                        for i, coord in enumerate(vertLoc):
+                            if i == 0:
+                                if obj.sxtools.tile_neg_x and (round(coord, 2) == round(xmin, 2)):
+                                    match = True
+                                    mod_normal[i] = 0.0
+                                elif obj.sxtools.tile_pos_x and (round(coord, 2) == round(xmax, 2)):
+                                    match = True
+                                    mod_normal[i] = 0.0
+                                else:
+                                    mod_normal[i] = vertNormal[i]
+                            elif i == 1:
+                                if obj.sxtools.tile_neg_y and (round(coord, 2) == round(ymin, 2)):
+                                    match = True
+                                    mod_normal[i] = 0.0
+                                elif obj.sxtools.tile_pos_y and (round(coord, 2) == round(ymax, 2)):
+                                    match = True
+                                    mod_normal[i] = 0.0
+                                else:
+                                    mod_normal[i] = vertNormal[i]
                             else:
-                                mod_normal[i] = vertNormal[i]
+                                if obj.sxtools.tile_neg_z and (round(coord, 2) == round(zmin, 2)):
+                                    match = True
+                                    mod_normal[i] = 0.0
+                                elif obj.sxtools.tile_pos_z and (round(coord, 2) == round(zmax, 2)):
+                                    match = True
+                                    mod_normal[i] = 0.0
+                                else:
+                                    mod_normal[i] = vertNormal[i]
 
-                    if match:
-                        vertNormal = Vector(mod_normal[:]).normalized()
+                        if match:
+                            vertNormal = Vector(mod_normal[:]).normalized()
 
-                # Pass 0: Raycast for bias
-                hit, loc, normal, index = obj.ray_cast(vertLoc, vertNormal, distance=dist)
-                if hit and (normal.dot(vertNormal) > 0):
-                    hit_dist = Vector((loc[0] - vertLoc[0], loc[1] - vertLoc[1], loc[2] - vertLoc[2])).length
-                    if hit_dist < 0.5:
-                        bias += hit_dist
+                    if vert_id in partner_dict:
+                        bias, occValue = local_occ_dict[partner_dict[vert_id]]
+                    else:
+                        # Pass 0: Raycast for bias
+                        hit, loc, normal, index = obj.ray_cast(vertLoc, vertNormal, distance=dist)
+                        if hit and (normal.dot(vertNormal) > 0):
+                            hit_dist = Vector((loc[0] - vertLoc[0], loc[1] - vertLoc[1], loc[2] - vertLoc[2])).length
+                            if hit_dist < 0.5:
+                                bias += hit_dist
 
-                # Pass 1: Local space occlusion for individual object
-                if 0.0 <= mix < 1.0:
-                    biasVec = tuple([bias*x for x in vertNormal])
-                    rotQuat = forward.rotation_difference(vertNormal)
+                    # Pass 1: Local space occlusion for individual object
+                    if (0.0 <= mix < 1.0) and (vert_id not in partner_dict):
+                        biasVec = tuple([bias*x for x in vertNormal])
+                        rotQuat = forward.rotation_difference(vertNormal)
 
-                    # offset ray origin with normal bias
-                    vertPos = (vertLoc[0] + biasVec[0], vertLoc[1] + biasVec[1], vertLoc[2] + biasVec[2])
+                        # offset ray origin with normal bias
+                        vertPos = (vertLoc[0] + biasVec[0], vertLoc[1] + biasVec[1], vertLoc[2] + biasVec[2])
 
-                    for sample in hemiSphere:
-                        sample = Vector(sample)
-                        sample.rotate(rotQuat)
+                        for sample in hemiSphere:
+                            sample = Vector(sample)
+                            sample.rotate(rotQuat)
 
-                        hit, loc, normal, index = obj_eval.ray_cast(vertPos, sample, distance=dist)
+                            hit, loc, normal, index = obj_eval.ray_cast(vertPos, sample, distance=dist)
 
-                        if hit:
-                            occValue -= contribution
+                            if hit:
+                                occValue -= contribution
 
-                # Pass 2: Worldspace occlusion for scene
-                if 0.0 < mix <= 1.0:
-                    biasVec = tuple([bias*x for x in vertWorldNormal])
-                    rotQuat = forward.rotation_difference(vertWorldNormal)
+                    if len(partner_dict) > 0:
+                        local_occ_dict[vert_id] = (bias, occValue)
 
-                    # offset ray origin with normal bias
-                    scnVertPos = (vertWorldLoc[0] + biasVec[0], vertWorldLoc[1] + biasVec[1], vertWorldLoc[2] + biasVec[2])
+                    # Pass 2: Worldspace occlusion for scene, traced per vertex as the scene may be asymmetric
+                    if 0.0 < mix <= 1.0:
+                        biasVec = tuple([bias*x for x in vertWorldNormal])
+                        rotQuat = forward.rotation_difference(vertWorldNormal)
 
-                    for sample in hemiSphere:
-                        sample = Vector(sample)
-                        sample.rotate(rotQuat)
+                        # offset ray origin with normal bias
+                        scnVertPos = (vertWorldLoc[0] + biasVec[0], vertWorldLoc[1] + biasVec[1], vertWorldLoc[2] + biasVec[2])
 
-                        scnHit, scnLoc, scnNormal, scnIndex, scnObj, ma = scene.ray_cast(edg, scnVertPos, sample, distance=dist)
-                        # scene.ray_cast(scene.view_layers[0].depsgraph, scnVertPos, sample, distance=dist)
+                        for sample in hemiSphere:
+                            sample = Vector(sample)
+                            sample.rotate(rotQuat)
 
-                        if scnHit:
-                            scnOccValue -= contribution
+                            scnHit, scnLoc, scnNormal, scnIndex, scnObj, ma = scene.ray_cast(edg, scnVertPos, sample, distance=dist)
+                            # scene.ray_cast(scene.view_layers[0].depsgraph, scnVertPos, sample, distance=dist)
 
-                vert_occ_dict[vert_id] = float((occValue * (1.0 - mix)) + (scnOccValue * mix))
+                            if scnHit:
+                                scnOccValue -= contribution
 
-            if groundplane:
-                bpy.data.objects.remove(ground, do_unlink=True)
-                bpy.data.meshes.remove(groundmesh, do_unlink=True)
+                    vert_occ_dict[vert_id] = float((occValue * (1.0 - mix)) + (scnOccValue * mix))
 
-            if obj.sxtools.tiling:
-                obj.modifiers['sxTiler'].show_viewport = False
-                obj.data.use_auto_smooth = True
+                    if (chunksize > 0) and ((n + 1) % chunksize == 0) and ((n + 1) < len(vert_ids)):
+                        for dup_id in duplicate_dict:
+                            if duplicate_dict[dup_id] in vert_occ_dict:
+                                vert_occ_dict[dup_id] = vert_occ_dict[duplicate_dict[dup_id]]
+                        if ground is not None:
+                            bpy.data.objects.remove(ground, do_unlink=True)
+                            bpy.data.meshes.remove(groundmesh, do_unlink=True)
+                            ground = None
+                        yield len(vert_occ_dict), len(vert_dict), vert_occ_dict
 
-            vert_occ_list = generate.vert_dict_to_loop_list(obj, vert_occ_dict, 1, 4)
-            return self.mask_list(obj, vert_occ_list, masklayer)
+                for vert_id in duplicate_dict:
+                    vert_occ_dict[vert_id] = vert_occ_dict[duplicate_dict[vert_id]]
 
-        else:
-            return None
+            finally:
+                if ground is not None:
+                    bpy.data.objects.remove(ground, do_unlink=True)
+                    bpy.data.meshes.remove(groundmesh, do_unlink=True)
+
+                if obj.sxtools.tiling:
+                    obj.modifiers['sxTiler'].show_viewport = False
+                    obj.data.use_auto_smooth = True
+
+            yield len(vert_dict), len(vert_dict), vert_occ_dict
+
+
+    # Maps each loop of obj to weighted source loops on the nearest face of source_obj,
+    # as flat arrays of target loops, source loops and weights.
+    # Both objects are expected to share the same local space (e.g. LODs)
+    def transfer_mapping(self, obj, source_obj):
+        source_mesh = source_obj.data
+        source_verts = [vert.co.copy() for vert in source_mesh.vertices]
+        bvh = BVHTree.FromPolygons(source_verts, [poly.vertices[:] for poly in source_mesh.polygons])
+
+        mesh = obj.data
+        targetLoops = []
+        sourceLoops = []
+        loopWeights = []
+        for poly in mesh.polygons:
+            center = poly.center
+            for vert_idx, loop_idx in zip(poly.vertices, poly.loop_indices):
+                # Nudge sample point inside the face to pick the correct source face at hard edges
+                co = mesh.vertices[vert_idx].co.lerp(center, 0.01)
+                location, normal, face_idx, dist = bvh.find_nearest(co)
+                if face_idx is None:
+                    continue
+
+                source_poly = source_mesh.polygons[face_idx]
+                weights = poly_3d_calc([source_verts[i] for i in source_poly.vertices], location)
+                targetLoops.extend([loop_idx] * len(weights))
+                sourceLoops.extend(source_poly.loop_indices)
+                loopWeights.extend(weights)
+
+        return (np.array(targetLoops, dtype=int), np.array(sourceLoops, dtype=int), np.array(loopWeights, dtype=float))
+
+
+    def transfer_list(self, obj, source_obj, sourcelayer, masklayer=None, mapping=None):
+        if mapping is None:
+            mapping = self.transfer_mapping(obj, source_obj)
+        targetLoops, sourceLoops, loopWeights = mapping
+
+        source_colors = np.array(layers.get_layer(source_obj, sourcelayer), dtype=float).reshape(-1, 4)
+        colors = np.zeros((len(obj.data.loops), 4), dtype=float)
+        np.add.at(colors, targetLoops, source_colors[sourceLoops] * loopWeights[:, None])
+
+        return self.mask_list(obj, colors.ravel().tolist(), masklayer)
 
 
     def mask_list(self, obj, colors, masklayer=None, as_tuple=False, override_mask=False):
@@ -2246,9 +2752,22 @@ class SXTOOLS_generate(object):
 
     def color_list(self, obj, color, masklayer=None, as_tuple=False):
         count = len(obj.data.color_attributes[0].data)
-        colors = [color[0], color[1], color[2], color[3]] * count
+        if as_tuple or ((masklayer is None) and (sxglobals.mode == 'OBJECT')):
+            colors = [color[0], color[1], color[2], color[3]] * count
+            return self.mask_list(obj, colors, masklayer, as_tuple)
+
+        # Constant color with the mask applied to alpha as one array operation
+        if masklayer is None:
+            mask, empty = self.selection_mask(obj)
+        else:
+            mask, empty = layers.get_layer_mask(obj, masklayer)
+        if empty:
+            return None
 
-        return self.mask_list(obj, colors, masklayer, as_tuple)
+        colors = np.empty((count, 4))
+        colors[:] = color[:4]
+        colors[:, 3] *= mask
+        return colors.ravel().tolist()
 
 
     def ramp_list(self, obj, objs, rampmode, masklayer=None, mergebbx=True):
@@ -2399,6 +2918,70 @@ class SXTOOLS_generate(object):
         return vertex_dict
 
 
+    # Returns {vert_id: first_vert_id} for vertices sharing a quantized position and normal
+    def duplicate_vertex_dict(self, vert_dict, tolerance=0.0001, normal_tolerance=0.01):
+        cluster_dict = {}
+        duplicate_dict = {}
+        for vert_id in vert_dict:
+            co = vert_dict[vert_id][0]
+            normal = vert_dict[vert_id][1]
+            key = (
+                round(co[0] / tolerance), round(co[1] / tolerance), round(co[2] / tolerance),
+                round(normal[0] / normal_tolerance), round(normal[1] / normal_tolerance), round(normal[2] / normal_tolerance))
+            if key in cluster_dict:
+                duplicate_dict[vert_id] = cluster_dict[key]
+            else:
+                cluster_dict[key] = vert_id
+
+        return duplicate_dict
+
+
+    # Returns {vert_id: canonical_vert_id} for vertices that mirror a vertex
+    # on the positive side of the enabled mirror axes
+    def mirror_partner_dict(self, obj, vert_dict, tolerance=0.0001):
+        axes = [i for i, axis in enumerate((obj.sxtools.xmirror, obj.sxtools.ymirror, obj.sxtools.zmirror)) if axis]
+        partner_dict = {}
+        if len(axes) == 0:
+            return partner_dict
+
+        if obj.sxtools.mirrorobject is not None:
+            center = obj.matrix_world.inverted() @ obj.sxtools.mirrorobject.matrix_world.to_translation()
+        else:
+            center = Vector((0.0, 0.0, 0.0))
+
+        # Spatial hash of quantized local positions
+        spatial_hash = {}
+        for vert_id in vert_dict:
+            co = vert_dict[vert_id][0]
+            key = (round(co[0] / tolerance), round(co[1] / tolerance), round(co[2] / tolerance))
+            spatial_hash.setdefault(key, []).append(vert_id)
+
+        offsets = [(i, j, k) for i in (-1, 0, 1) for j in (-1, 0, 1) for k in (-1, 0, 1)]
+
+        for vert_id in vert_dict:
+            co = Vector(vert_dict[vert_id][0])
+            normal = Vector(vert_dict[vert_id][1])
+            reflected = False
+            for axis in axes:
+                if (co[axis] - center[axis]) < -tolerance:
+                    co[axis] = 2.0 * center[axis] - co[axis]
+                    normal[axis] = -normal[axis]
+                    reflected = True
+
+            if reflected:
+                key = (round(co[0] / tolerance), round(co[1] / tolerance), round(co[2] / tolerance))
+                for offset in offsets:
+                    cell = (key[0] + offset[0], key[1] + offset[1], key[2] + offset[2])
+                    for candidate in spatial_hash.get(cell, []):
+                        if ((co - vert_dict[candidate][0]).length <= tolerance) and (normal.dot(vert_dict[candidate][1]) > 0.999):
+                            partner_dict[vert_id] = candidate
+                            break
+                    if vert_id in partner_dict:
+                        break
+
+        return partner_dict
+
+
     def selection_mask(self, obj):
         mesh = obj.data
         count = len(mesh.uv_layers[0].data)
@@ -2492,6 +3075,8 @@ class SXTOOLS_layers(object):
 
     # takes RGBA buffers, converts and writes to appropriate uv and vertex sets
     def set_layer(self, obj, colors, targetlayer):
+        journal.record(obj, targetlayer)
+
         def constant_alpha_test(values):
             for value in values:
                 if value != 1.0:
@@ -2517,6 +3102,47 @@ class SXTOOLS_layers(object):
         elif targetType == 'UV4':
             layers.set_uv4(obj, targetlayer, colors)
 
+        self.bump_layer_version(obj, targetlayer)
+
+
+    def bump_layer_version(self, obj, layer):
+        sxglobals.layerVersion += 1
+        sxglobals.layerVersions[(obj.name, layer.index)] = sxglobals.layerVersion
+        sxglobals.pendingWrites.add(obj.name)
+        sxglobals.pendingWrites.add(obj.data.name)
+
+
+    def get_layer_version(self, obj, layer):
+        return sxglobals.layerVersions.get((obj.name, layer.index), 0)
+
+
+    # Drop cached composites, debug views and layer versions
+    # of objects that no longer exist
+    def prune_composite_cache(self):
+        for cache in (sxglobals.compositeCache, sxglobals.debugCache):
+            for name in [name for name in cache if name not in bpy.data.objects]:
+                del cache[name]
+        for key in [key for key in sxglobals.layerVersions if key[0] not in bpy.data.objects]:
+            del sxglobals.layerVersions[key]
+
+
+    # Drop cached composites when layer data may have changed
+    # outside of set_layer (undo, edit mode, file load)
+    def clear_composite_cache(self, objs=None):
+        if objs is None:
+            sxglobals.compositeCache.clear()
+            sxglobals.debugCache.clear()
+            sxglobals.paletteIndexCache.clear()
+            sxglobals.batchBuffers = None
+        else:
+            for obj in objs:
+                sxglobals.compositeCache.pop(obj.name, None)
+                sxglobals.debugCache.pop(obj.name, None)
+                sxglobals.layerMaps.pop(obj.name, None)
+                for layer in obj.sxlayers:
+                    sxglobals.paletteIndexCache.pop((obj.name, layer.index), None)
+                    sxglobals.layerVersions.pop((obj.name, layer.index), None)
+
 
     def get_layer_mask(self, obj, sourcelayer):
         layerType = sourcelayer.layerType
@@ -2648,6 +3274,56 @@ class SXTOOLS_layers(object):
         self.set_uvs(obj, target2, uvs1, None)
 
 
+    # Writes one constant color to a whole layer,
+    # UV targets get a single luminance value instead of per-loop conversion
+    def fill_layer(self, obj, layer, color, uvbuffers=None):
+        journal.record(obj, layer)
+        channels = {'U': 0, 'V': 1}
+        count = len(obj.data.loops)
+        layerType = layer.layerType
+
+        # With uvbuffers, UV maps are collected for the caller to write once
+        def uv_buffer(name, read=True):
+            if (uvbuffers is not None) and (name in uvbuffers):
+                return uvbuffers[name]
+            uvs = np.zeros(count * 2, dtype=np.float32)
+            if read or (uvbuffers is not None):
+                obj.data.uv_layers[name].data.foreach_get('uv', uvs)
+            if uvbuffers is not None:
+                uvbuffers[name] = uvs
+            return uvs
+
+        def uv_write(name, uvs):
+            if uvbuffers is None:
+                obj.data.uv_layers[name].data.foreach_set('uv', uvs)
+
+        if layerType == 'COLOR':
+            colors = np.empty((count, 4), dtype=np.float32)
+            colors[:] = color[:4]
+            obj.data.attributes[layer.vertexColorLayer].data.foreach_set('color', colors.ravel())
+
+        elif layerType == 'UV':
+            if ((layer.name == 'gradient1') or (layer.name == 'gradient2')) and (color[3] != 1.0):
+                value = color[3]
+            else:
+                value = convert.color_to_luminance(color)
+            uvs = uv_buffer(layer.uvLayer0)
+            uvs[channels[layer.uvChannel0]::2] = value
+            uv_write(layer.uvLayer0, uvs)
+
+        elif layerType == 'UV4':
+            uvs = uv_buffer(layer.uvLayer0, read=False)
+            uvs[channels[layer.uvChannel0]::2] = color[0]
+            uvs[channels[layer.uvChannel1]::2] = color[1]
+            uv_write(layer.uvLayer0, uvs)
+            uvs = uv_buffer(layer.uvLayer2, read=False)
+            uvs[channels[layer.uvChannel2]::2] = color[2]
+            uvs[channels[layer.uvChannel3]::2] = color[3]
+            uv_write(layer.uvLayer2, uvs)
+
+        self.bump_layer_version(obj, layer)
+
+
     def clear_layers(self, objs, targetlayer=None):
         scene = bpy.context.scene.sxtools
 
@@ -2667,8 +3343,7 @@ class SXTOOLS_layers(object):
                             default_color = (0.5, 0.5, 0.5, 1.0)
                         elif layer.layerType == 'COLOR':
                             default_color = (0.0, 0.0, 0.0, 0.0)
-                colors = generate.color_list(obj, color=default_color)
-                layers.set_layer(obj, colors, layer)
+                layers.fill_layer(obj, layer, default_color)
             else:
                 if (targetlayer.name == 'gradient1') or (targetlayer.name == 'gradient2'):
                     colors = layers.get_layer(obj, layer, uv_as_alpha=True)
@@ -2697,6 +3372,26 @@ class SXTOOLS_layers(object):
                 obj.data.update()
 
 
+    # Resets UV layers to their defaults, layers sharing
+    # a UV map are filled into one buffer written once per map
+    def clear_uv_layers(self, obj, sxLayers):
+        if sxglobals.mode != 'OBJECT':
+            for sxLayer in sxLayers:
+                self.clear_layers([obj, ], sxLayer)
+            return
+
+        uvbuffers = {}
+        for sxLayer in sxLayers:
+            sxLayer.alpha = 1.0
+            sxLayer.visibility = True
+            sxLayer.locked = False
+            self.fill_layer(obj, sxLayer, sxLayer.defaultColor[:], uvbuffers)
+
+        for name, uvs in uvbuffers.items():
+            obj.data.uv_layers[name].data.foreach_set('uv', uvs)
+        obj.data.update()
+
+
     def composite_layers(self, objs):
         if sxglobals.composite:
             # then = time.perf_counter()
@@ -2720,43 +3415,368 @@ class SXTOOLS_layers(object):
     def blend_debug(self, objs, layer, shadingmode):
         active = bpy.context.view_layer.objects.active
         bpy.context.view_layer.objects.active = objs[0]
+        self.prune_composite_cache()
 
         for obj in objs:
-            colors = self.get_layer(obj, layer, uv_as_alpha=True)
-            count = len(colors)//4
+            composite = obj.sxlayers['composite']
+            key = (layer.index, shadingmode, self.get_layer_version(obj, layer), layer.alpha)
+            cache = sxglobals.debugCache.setdefault(obj.name, {'shown': None, 'key': None, 'colors': None})
 
-            if shadingmode == 'DEBUG':
-                for i in range(count):
-                    color = colors[(0+i*4):(4+i*4)]
-                    a = color[3] * layer.alpha
-                    colors[(0+i*4):(4+i*4)] = [color[0]*a, color[1]*a, color[2]*a, 1.0]
-            elif shadingmode == 'ALPHA':
-                for i in range(count):
-                    a = colors[3+i*4] * layer.alpha
-                    colors[(0+i*4):(4+i*4)] = [a, a, a, 1.0]
+            # Composite already holds this debug view
+            if cache['shown'] == (key, self.get_layer_version(obj, composite)):
+                continue
 
-            self.set_layer(obj, colors, obj.sxlayers['composite'])
+            # Only the most recent view is kept per object
+            if cache['key'] == key:
+                colors = cache['colors']
+            else:
+                count = len(obj.data.loops)
+                colors = np.empty((count, 4), dtype=np.float32)
+                self.get_layer_array(obj, layer, colors, np.empty(count * 2, dtype=np.float32), uv_as_alpha=True)
+                a = colors[:, 3:4] * layer.alpha
+
+                if shadingmode == 'DEBUG':
+                    colors[:, :3] *= a
+                    colors[:, 3] = 1.0
+                elif shadingmode == 'ALPHA':
+                    colors[:, :3] = a
+                    colors[:, 3] = 1.0
+                cache['key'] = key
+                cache['colors'] = colors
+
+            self.set_layer(obj, colors.ravel(), composite)
+            cache['shown'] = (key, self.get_layer_version(obj, composite))
             # obj.data.update()
         bpy.context.view_layer.objects.active = active
 
 
+    # Everything that affects how a layer contributes to the composite
+    def layer_signature(self, obj, layer):
+        palettecolor = None
+        if layer.name == 'gradient1':
+            palettecolor = tuple(bpy.data.materials['SXMaterial'].node_tree.nodes['PaletteColor3'].outputs[0].default_value)
+        elif layer.name == 'gradient2':
+            palettecolor = tuple(bpy.data.materials['SXMaterial'].node_tree.nodes['PaletteColor4'].outputs[0].default_value)
+
+        return (self.get_layer_version(obj, layer), layer.visibility, layer.blendMode, layer.alpha, palettecolor)
+
+
+    # Reads layer data straight into an (N, 4) float32 buffer
+    def get_layer_array(self, obj, sourcelayer, out, uvbuffer, uv_as_alpha=False, gradient_with_palette=False):
+        channels = {'U': 0, 'V': 1}
+        sourceType = sourcelayer.layerType
+
+        if sourceType == 'COLOR':
+            obj.data.attributes[sourcelayer.vertexColorLayer].data.foreach_get('color', out.ravel())
+
+        elif sourceType == 'UV':
+            obj.data.uv_layers[sourcelayer.uvLayer0].data.foreach_get('uv', uvbuffer)
+            values = uvbuffer[channels[sourcelayer.uvChannel0]::2]
+
+            if uv_as_alpha:
+                dv = [1.0, 1.0, 1.0, 1.0]
+                if gradient_with_palette:
+                    sxmaterial = bpy.data.materials['SXMaterial'].node_tree
+                    if sourcelayer.name == 'gradient1':
+                        dv = sxmaterial.nodes['PaletteColor3'].outputs[0].default_value
+                    elif sourcelayer.name == 'gradient2':
+                        dv = sxmaterial.nodes['PaletteColor4'].outputs[0].default_value
+                out[:, :3] = dv[:3]
+                out[values <= 0.0, :3] = 0.0
+                out[:, 3] = values
+            else:
+                out[:, :3] = values[:, None]
+                out[:, 3] = 1.0
+
+        elif sourceType == 'UV4':
+            obj.data.uv_layers[sourcelayer.uvLayer0].data.foreach_get('uv', uvbuffer)
+            out[:, 0] = uvbuffer[channels[sourcelayer.uvChannel0]::2]
+            out[:, 1] = uvbuffer[channels[sourcelayer.uvChannel1]::2]
+            obj.data.uv_layers[sourcelayer.uvLayer2].data.foreach_get('uv', uvbuffer)
+            out[:, 2] = uvbuffer[channels[sourcelayer.uvChannel2]::2]
+            out[:, 3] = uvbuffer[channels[sourcelayer.uvChannel3]::2]
+
+        return out
+
+
+    def read_layer_array(self, obj, sourcelayer, uv_as_alpha=False):
+        count = len(obj.data.loops)
+        colors = np.empty((count, 4), dtype=np.float32)
+        return self.get_layer_array(obj, sourcelayer, colors, np.empty(count * 2, dtype=np.float32), uv_as_alpha=uv_as_alpha)
+
+
+    # Array counterpart of set_layer, UV channels are written through strided views
+    def set_layer_array(self, obj, colors, targetlayer):
+        journal.record(obj, targetlayer)
+        channels = {'U': 0, 'V': 1}
+        count = len(obj.data.loops)
+        targetType = targetlayer.layerType
+
+        if targetType == 'COLOR':
+            obj.data.attributes[targetlayer.vertexColorLayer].data.foreach_set('color', np.ascontiguousarray(colors, dtype=np.float32).ravel())
+
+        elif targetType == 'UV':
+            if ((targetlayer.name == 'gradient1') or (targetlayer.name == 'gradient2')) and (colors[:, 3] != 1.0).any():
+                values = colors[:, 3]
+            else:
+                values = (colors[:, :3] @ np.array([0.212655, 0.715158, 0.072187], dtype=np.float32)) * colors[:, 3]
+            targetUVs = obj.data.uv_layers[targetlayer.uvLayer0].data
+            uvs = np.empty(count * 2, dtype=np.float32)
+            targetUVs.foreach_get('uv', uvs)
+            uvs[channels[targetlayer.uvChannel0]::2] = values
+            targetUVs.foreach_set('uv', uvs)
+
+        elif targetType == 'UV4':
+            uvs = np.zeros(count * 2, dtype=np.float32)
+            uvs[channels[targetlayer.uvChannel0]::2] = colors[:, 0]
+            uvs[channels[targetlayer.uvChannel1]::2] = colors[:, 1]
+            obj.data.uv_layers[targetlayer.uvLayer0].data.foreach_set('uv', uvs)
+            uvs[:] = 0.0
+            uvs[channels[targetlayer.uvChannel2]::2] = colors[:, 2]
+            uvs[channels[targetlayer.uvChannel3]::2] = colors[:, 3]
+            obj.data.uv_layers[targetlayer.uvLayer2].data.foreach_set('uv', uvs)
+
+        self.bump_layer_version(obj, targetlayer)
+
+
+    # Compact form of a color layer: a uint8 palette index per loop,
+    # a color table and per-entry loop counts. Returns None for
+    # non-color layers or more than 256 distinct colors.
+    def get_layer_indices(self, obj, layer):
+        if layer.layerType != 'COLOR':
+            return None
+
+        key = (obj.name, layer.index)
+        count = len(obj.data.loops)
+        version = self.get_layer_version(obj, layer)
+        colors = self.read_layer_array(obj, layer)
+
+        # Vertex painting and other edits bypass set_layer, so the cached
+        # indices are checked against the layer data before they are trusted
+        cached = sxglobals.paletteIndexCache.get(key)
+        if (cached is not None) and (cached[1] == count) and (cached[2] is not None):
+            indexed = cached[2]
+            if np.array_equal(colors.view(np.uint32), indexed['table'][indexed['indices']].view(np.uint32)):
+                sxglobals.paletteIndexCache[key] = (version, count, indexed)
+                return indexed
+        rows = colors.view(np.dtype((np.void, 16))).ravel()
+        unique, first, inverse, counts = np.unique(rows, return_index=True, return_inverse=True, return_counts=True)
+        if len(unique) > 256:
+            indexed = None
+        else:
+            indexed = {'indices': inverse.reshape(-1).astype(np.uint8), 'table': colors[first], 'counts': counts}
+
+        sxglobals.paletteIndexCache[key] = (version, count, indexed)
+        return indexed
+
+
+    # Expands a color table through palette indices into the layer,
+    # the indices stay valid so the cache is carried over to the new version
+    def set_layer_indices(self, obj, layer, indices, table):
+        self.set_layer_array(obj, table[indices], layer)
+        counts = np.bincount(indices, minlength=len(table))
+        indexed = {'indices': indices, 'table': table, 'counts': counts}
+        sxglobals.paletteIndexCache[(obj.name, layer.index)] = (self.get_layer_version(obj, layer), len(indices), indexed)
+
+
+    # Copies or swaps single-channel UV layers without
+    # expanding them to colors, maps are read once if shared
+    def paste_uv_channel(self, obj, sourceLayer, targetLayer, swap=False):
+        journal.record(obj, targetLayer)
+        if swap:
+            journal.record(obj, sourceLayer)
+        channels = {'U': 0, 'V': 1}
+        count = len(obj.data.loops)
+        sc = channels[sourceLayer.uvChannel0]
+        tc = channels[targetLayer.uvChannel0]
+
+        sourceUVs = obj.data.uv_layers[sourceLayer.uvLayer0].data
+        targetUVs = obj.data.uv_layers[targetLayer.uvLayer0].data
+        source_uvs = np.empty(count * 2, dtype=np.float32)
+        sourceUVs.foreach_get('uv', source_uvs)
+        if sourceLayer.uvLayer0 == targetLayer.uvLayer0:
+            target_uvs = source_uvs
+        else:
+            target_uvs = np.empty(count * 2, dtype=np.float32)
+            targetUVs.foreach_get('uv', target_uvs)
+
+        targetvalues = target_uvs[tc::2].copy()
+        target_uvs[tc::2] = source_uvs[sc::2]
+        if swap:
+            source_uvs[sc::2] = targetvalues
+
+        targetUVs.foreach_set('uv', target_uvs)
+        self.bump_layer_version(obj, targetLayer)
+        if swap:
+            if target_uvs is not source_uvs:
+                sourceUVs.foreach_set('uv', source_uvs)
+            self.bump_layer_version(obj, sourceLayer)
+
+
+    # Reads the visible layers from start upward into the shared (L, N, 4) stack buffer,
+    # then blends them over the cached partials in a single pass
+    def evaluate_stack(self, obj, baseLayer, topLayerArray, cache, start=0, uv_as_alpha=False):
+        count = cache['count']
+        layercount = len(topLayerArray)
+        buffers = self.batch_buffers(layercount, count)
+        partials = cache['partials']
+        stack = buffers['stack'][:layercount, :count]
+        uvbuffer = buffers['scratch']['uv'][:count*2]
+        scratch = {key: value[:count] for key, value in buffers['scratch'].items() if key != 'uv'}
+
+        if start == 0:
+            self.get_layer_array(obj, baseLayer, partials[0], uvbuffer, uv_as_alpha=uv_as_alpha)
+            start = 1
+
+        stackLayers = [obj.sxlayers[layer.index] for layer in topLayerArray]
+        for i in range(start, len(stackLayers) + 1):
+            if stackLayers[i-1].visibility:
+                self.get_layer_array(obj, stackLayers[i-1], stack[i-1], uvbuffer, uv_as_alpha=uv_as_alpha, gradient_with_palette=True)
+
+        for i in range(start, len(stackLayers) + 1):
+            layer = stackLayers[i-1]
+            if layer.visibility:
+                tools.blend_into(stack[i-1], partials[i-1], partials[i], layer.blendMode, layer.alpha, scratch)
+            else:
+                partials[i] = partials[i-1]
+
+        return partials[-1]
+
+
+    # Concatenated stack, partials and scratch shared by the evaluations
+    # of one pass, reallocated only when a batch outgrows them
+    def batch_buffers(self, layercount, count):
+        buffers = sxglobals.batchBuffers
+        if (buffers is None) or (buffers['layers'] < layercount) or (buffers['count'] < count):
+            if buffers is not None:
+                layercount = max(layercount, buffers['layers'])
+                count = max(count, buffers['count'])
+            buffers = {
+                'layers': layercount,
+                'count': count,
+                'partials': np.empty((layercount + 1, count, 4), dtype=np.float32),
+                'stack': np.empty((layercount, count, 4), dtype=np.float32),
+                'scratch': tools.blend_scratch(count)}
+            sxglobals.batchBuffers = buffers
+        return buffers
+
+
+    # Composites objects with matching layer setups as one concatenated
+    # loop buffer, then splits the partials back to the per-object caches
+    def evaluate_batch(self, batch, baseLayer, topLayerArray, start=0, uv_as_alpha=False):
+        offsets = [0, ]
+        for obj, cache, signatures in batch:
+            offsets.append(offsets[-1] + cache['count'])
+        total = offsets[-1]
+
+        layercount = len(topLayerArray)
+        buffers = self.batch_buffers(layercount, total)
+        partials = buffers['partials'][:(layercount + 1), :total]
+        stack = buffers['stack'][:layercount, :total]
+        uvbuffer = buffers['scratch']['uv']
+        scratch = {key: value[:total] for key, value in buffers['scratch'].items() if key != 'uv'}
+
+        for j, (obj, cache, signatures) in enumerate(batch):
+            first, last = offsets[j], offsets[j+1]
+            if start == 0:
+                self.get_layer_array(obj, baseLayer, partials[0, first:last], uvbuffer[:(last-first)*2], uv_as_alpha=uv_as_alpha)
+            else:
+                partials[start-1, first:last] = cache['partials'][start-1]
+
+            for i in range(max(start, 1), len(topLayerArray) + 1):
+                layer = obj.sxlayers[topLayerArray[i-1].index]
+                if layer.visibility:
+                    self.get_layer_array(obj, layer, stack[i-1, first:last], uvbuffer[:(last-first)*2], uv_as_alpha=uv_as_alpha, gradient_with_palette=True)
+
+        # Blend modes and alphas are identical within a batch
+        obj = batch[0][0]
+        for i in range(max(start, 1), len(topLayerArray) + 1):
+            layer = obj.sxlayers[topLayerArray[i-1].index]
+            if layer.visibility:
+                tools.blend_into(stack[i-1], partials[i-1], partials[i], layer.blendMode, layer.alpha, scratch)
+            else:
+                partials[i] = partials[i-1]
+
+        for j, (obj, cache, signatures) in enumerate(batch):
+            cache['partials'][start:] = partials[start:, offsets[j]:offsets[j+1]]
+
+
+    # Partial composites below each layer are cached per object,
+    # only the stack from the lowest changed layer upward is re-blended.
+    # Objects sharing the dirty range and layer settings are batched.
     def blend_layers(self, objs, topLayerArray, baseLayer, resultLayer, uv_as_alpha=False):
         active = bpy.context.view_layer.objects.active
         bpy.context.view_layer.objects.active = objs[0]
+        self.prune_composite_cache()
 
+        batches = {}
         for obj in objs:
-            basecolors = self.get_layer(obj, baseLayer, uv_as_alpha=uv_as_alpha)
-
+            count = len(obj.data.loops)
+            config = (baseLayer.index, resultLayer.index, uv_as_alpha, tuple([layer.index for layer in topLayerArray]))
+            signatures = [(self.get_layer_version(obj, baseLayer), )]
             for layer in topLayerArray:
-                layerIdx = layer.index
+                signatures.append(self.layer_signature(obj, obj.sxlayers[layer.index]))
+
+            # Re-insert to keep the cache in least recently used order
+            cache = sxglobals.compositeCache.pop(obj.name, None)
+            if cache is not None:
+                sxglobals.compositeCache[obj.name] = cache
+            if (cache is None) or (cache['config'] != config) or (cache['count'] != count):
+                cache = {
+                    'config': config,
+                    'count': count,
+                    'signatures': [],
+                    'resultVersion': None,
+                    'partials': np.empty((len(topLayerArray) + 1, count, 4), dtype=np.float32)}
+                sxglobals.compositeCache[obj.name] = cache
+
+            start = 0
+            while (start < len(signatures)) and (start < len(cache['signatures'])) and (signatures[start] == cache['signatures'][start]):
+                start += 1
+
+            if (start == len(signatures)) and (cache['resultVersion'] == self.get_layer_version(obj, resultLayer)):
+                continue
+
+            blendKey = tuple([signature[1:4] for signature in signatures[max(start, 1):]])
+            batches.setdefault((config, start, blendKey), []).append((obj, cache, signatures))
+
+        # Split batches so the shared buffers stay within the loop budget
+        chunks = []
+        for (config, start, blendKey), batch in batches.items():
+            loops = 0
+            chunks.append((start, []))
+            for item in batch:
+                if chunks[-1][1] and (loops + item[1]['count'] > sxglobals.batchLoopBudget):
+                    chunks.append((start, []))
+                    loops = 0
+                chunks[-1][1].append(item)
+                loops += item[1]['count']
+
+        for start, batch in chunks:
+            if start > len(topLayerArray):
+                pass
+            elif len(batch) > 1:
+                self.evaluate_batch(batch, baseLayer, topLayerArray, start, uv_as_alpha)
+            else:
+                obj, cache, signatures = batch[0]
+                self.evaluate_stack(obj, baseLayer, topLayerArray, cache, start, uv_as_alpha)
+
+            for obj, cache, signatures in batch:
+                cache['signatures'] = signatures
+                result = cache['partials'][-1]
+                if resultLayer.layerType == 'COLOR':
+                    self.set_layer(obj, result.ravel(), resultLayer)
+                else:
+                    self.set_layer(obj, result.ravel().tolist(), resultLayer)
+                cache['resultVersion'] = self.get_layer_version(obj, resultLayer)
+
+        # Release the shared buffers once the pass is done
+        sxglobals.batchBuffers = None
 
-                if getattr(obj.sxlayers[layerIdx], 'visibility'):
-                    blendmode = getattr(obj.sxlayers[layerIdx], 'blendMode')
-                    layeralpha = getattr(obj.sxlayers[layerIdx], 'alpha')
-                    topcolors = self.get_layer(obj, obj.sxlayers[layerIdx], uv_as_alpha=uv_as_alpha, gradient_with_palette=True)
-                    basecolors = tools.blend_values(topcolors, basecolors, blendmode, layeralpha)
+        evict = len(sxglobals.compositeCache) - max(sxglobals.compositeCacheLimit, len(objs))
+        for name in list(sxglobals.compositeCache)[:max(evict, 0)]:
+            del sxglobals.compositeCache[name]
 
-            self.set_layer(obj, basecolors, resultLayer)
         bpy.context.view_layer.objects.active = active
 
 
@@ -2863,25 +3883,39 @@ class SXTOOLS_layers(object):
                     setattr(obj.sxlayers[targetLayer.index], 'blendMode', sourceBlend)
                     setattr(obj.sxlayers[targetLayer.index], 'alpha', sourceAlpha)
 
+        uvToUV = (sourceMode == 'UV') and (targetMode == 'UV')
+
         if fillMode == 'swap':
             for obj in objs:
-                layer1_colors = layers.get_layer(obj, sourceLayer)
-                layer2_colors = layers.get_layer(obj, targetLayer)
-                layers.set_layer(obj, layer1_colors, targetLayer)
-                layers.set_layer(obj, layer2_colors, sourceLayer)
+                if uvToUV:
+                    self.paste_uv_channel(obj, sourceLayer, targetLayer, swap=True)
+                else:
+                    layer1_colors = self.read_layer_array(obj, sourceLayer)
+                    layer2_colors = self.read_layer_array(obj, targetLayer)
+                    self.set_layer_array(obj, layer1_colors, targetLayer)
+                    self.set_layer_array(obj, layer2_colors, sourceLayer)
         elif fillMode == 'mask':
             for obj in objs:
-                colors = layers.get_layer(obj, targetLayer)
-                sourcevalues = generate.mask_list(obj, colors, sourceLayer, override_mask=True)
-                layers.set_layer(obj, sourcevalues, targetLayer)
+                # Source alpha overrides target alpha in place
+                mask = self.read_layer_array(obj, sourceLayer, uv_as_alpha=True)[:, 3]
+                if mask.any():
+                    colors = self.read_layer_array(obj, targetLayer)
+                    colors[:, 3] = mask
+                    self.set_layer_array(obj, colors, targetLayer)
         else:
             for obj in objs:
-                colors = self.get_layer(obj, sourceLayer)
                 if sxglobals.mode == 'EDIT':
-                    targetvalues = self.get_layer(obj, targetLayer)
-                    colors = generate.mask_list(obj, colors)
-                    colors = tools.blend_values(colors, targetvalues, 'ALPHA', 1.0)
-                layers.set_layer(obj, colors, targetLayer)
+                    mask, empty = generate.selection_mask(obj)
+                    if not empty:
+                        colors = self.read_layer_array(obj, sourceLayer)
+                        targetvalues = self.read_layer_array(obj, targetLayer)
+                        colors[:, 3] *= np.array(mask, dtype=np.float32)
+                        tools.blend_into(colors, targetvalues.copy(), targetvalues, 'ALPHA', 1.0, tools.blend_scratch(len(targetvalues)))
+                        self.set_layer_array(obj, targetvalues, targetLayer)
+                elif uvToUV:
+                    self.paste_uv_channel(obj, sourceLayer, targetLayer)
+                else:
+                    self.set_layer_array(obj, self.read_layer_array(obj, sourceLayer), targetLayer)
 
         utils.mode_manager(objs, revert=True, mode_id='paste_layer')
 
@@ -2957,6 +3991,204 @@ class SXTOOLS_layers(object):
         print('SX Tools: Exiting layers')
 
 
+# ------------------------------------------------------------------------
+#    Layer Undo Journal
+#    NOTE: Writes made during one operator are grouped into
+#          a step that is closed by a timer on the next event loop
+# ------------------------------------------------------------------------
+class SXTOOLS_journal(object):
+    def __init__(self):
+        return None
+
+
+    # Color attributes and UV maps that hold the data of a layer
+    def layer_storage(self, layer):
+        if layer.layerType == 'COLOR':
+            return [('COLOR', layer.vertexColorLayer), ]
+        elif layer.layerType == 'UV':
+            return [('UV', layer.uvLayer0), ]
+        elif layer.layerType == 'UV4':
+            return [('UV', layer.uvLayer0), ('UV', layer.uvLayer2)]
+        return []
+
+
+    def read_storage(self, obj, kind, name):
+        if kind == 'COLOR':
+            data = obj.data.attributes[name].data
+            values = np.empty(len(data) * 4, dtype=np.float32)
+            data.foreach_get('color', values)
+        else:
+            data = obj.data.uv_layers[name].data
+            values = np.empty(len(data) * 2, dtype=np.float32)
+            data.foreach_get('uv', values)
+        return values
+
+
+    def write_storage(self, obj, kind, name, values):
+        if kind == 'COLOR':
+            data = obj.data.attributes[name].data
+            if len(data) * 4 == len(values):
+                data.foreach_set('color', values)
+                return True
+        else:
+            data = obj.data.uv_layers[name].data
+            if len(data) * 2 == len(values):
+                data.foreach_set('uv', values)
+                return True
+        return False
+
+
+    # Layer writes are journaled only inside recorded calls
+    # from user-facing operators, internal writes stay out
+    def recorded(self, function, *args, **kwargs):
+        journal = sxglobals.undoJournal
+        recording = journal['recording']
+        journal['recording'] = True
+        try:
+            return function(*args, **kwargs)
+        finally:
+            journal['recording'] = recording
+
+
+    # Snapshots layer data before its first write in the current step
+    def record(self, obj, layer):
+        journal = sxglobals.undoJournal
+        if journal['suspended'] or (not journal['recording']) or bpy.app.background or (layer.index == 0):
+            return
+
+        step = journal['step']
+        if step is None:
+            step = {'entries': {}, 'layers': set()}
+            journal['step'] = step
+            if not bpy.app.timers.is_registered(close_journal_step):
+                bpy.app.timers.register(close_journal_step, first_interval=0.0)
+
+        step['layers'].add((obj.name, layer.index))
+        for kind, name in self.layer_storage(layer):
+            key = (obj.name, kind, name)
+            if key not in step['entries']:
+                step['entries'][key] = zlib.compress(self.read_storage(obj, kind, name).tobytes(), 1)
+
+
+    # Stores the after-state as an XOR delta, which compresses
+    # to almost nothing for the untouched parts of a layer
+    def close_step(self):
+        journal = sxglobals.undoJournal
+        step = journal['step']
+        if (step is None) or step.get('held', False):
+            return None
+        journal['step'] = None
+
+        entries = {}
+        for (objName, kind, name), before in step['entries'].items():
+            obj = bpy.data.objects.get(objName)
+            if obj is None:
+                continue
+            beforeValues = np.frombuffer(zlib.decompress(before), dtype=np.uint32)
+            afterValues = self.read_storage(obj, kind, name).view(np.uint32)
+            if len(beforeValues) != len(afterValues):
+                continue
+            delta = np.bitwise_xor(beforeValues, afterValues)
+            if not delta.any():
+                continue
+            delta = zlib.compress(delta.tobytes(), 1)
+            entries[(objName, kind, name)] = (before, delta)
+
+        if len(entries) == 0:
+            return None
+
+        step = {'entries': entries, 'layers': step['layers'], 'size': sum([len(before) + len(delta) for before, delta in entries.values()])}
+        for redoStep in journal['redo']:
+            journal['size'] -= redoStep['size']
+        journal['redo'].clear()
+        journal['undo'].append(step)
+        journal['size'] += step['size']
+        self.evict()
+        return None
+
+
+    # Snapshots the layers of a long-running edit up front and keeps
+    # the step open until end_step, ignoring the writes in between
+    def begin_step(self, objs, layer_index):
+        self.close_step()
+        for obj in objs:
+            self.recorded(self.record, obj, utils.find_layer_from_index(obj, layer_index))
+
+        journal = sxglobals.undoJournal
+        if journal['step'] is not None:
+            journal['step']['held'] = True
+        journal['suspended'] = True
+
+
+    def end_step(self):
+        journal = sxglobals.undoJournal
+        journal['suspended'] = False
+        if journal['step'] is not None:
+            journal['step']['held'] = False
+        self.close_step()
+
+
+    # Drops the least recently used steps beyond the memory cap
+    def evict(self):
+        journal = sxglobals.undoJournal
+        cap = bpy.context.preferences.addons['sxtools'].preferences.undomemory * 1048576
+        while (journal['size'] > cap) and (len(journal['undo']) + len(journal['redo']) > 0):
+            if len(journal['undo']) > 0:
+                step = journal['undo'].pop(0)
+            else:
+                step = journal['redo'].pop(0)
+            journal['size'] -= step['size']
+
+
+    def clear(self):
+        sxglobals.undoJournal.update({'undo': [], 'redo': [], 'size': 0, 'step': None})
+
+
+    def restore(self, step, redo=False):
+        objs = []
+        for (objName, kind, name), (before, delta) in step['entries'].items():
+            obj = bpy.data.objects.get(objName)
+            if obj is None:
+                continue
+            values = np.frombuffer(bytearray(zlib.decompress(before)), dtype=np.uint32)
+            if redo:
+                values = np.bitwise_xor(values, np.frombuffer(zlib.decompress(delta), dtype=np.uint32))
+            if self.write_storage(obj, kind, name, values.view(np.float32)) and (obj not in objs):
+                objs.append(obj)
+
+        for objName, index in step['layers']:
+            obj = bpy.data.objects.get(objName)
+            if obj is not None:
+                layers.bump_layer_version(obj, obj.sxlayers[index])
+        for obj in objs:
+            obj.data.update()
+        return objs
+
+
+    def undo(self):
+        self.close_step()
+        journal = sxglobals.undoJournal
+        if len(journal['undo']) == 0:
+            return []
+        step = journal['undo'].pop()
+        journal['redo'].append(step)
+        return self.restore(step)
+
+
+    def redo(self):
+        self.close_step()
+        journal = sxglobals.undoJournal
+        if len(journal['redo']) == 0:
+            return []
+        step = journal['redo'].pop()
+        journal['undo'].append(step)
+        return self.restore(step, redo=True)
+
+
+    def __del__(self):
+        print('SX Tools: Exiting journal')
+
+
 # ------------------------------------------------------------------------
 #    Tool Actions
 # ------------------------------------------------------------------------
@@ -3008,6 +4240,76 @@ class SXTOOLS_tools(object):
             return colors
 
 
+    # Preallocated buffers for blend_into and array layer reads
+    def blend_scratch(self, count):
+        scratch = {
+            'a': np.empty((count, 1), dtype=np.float32),
+            'inv': np.empty((count, 1), dtype=np.float32),
+            'alpha': np.empty(count, dtype=np.float32),
+            'tmp': np.empty((count, 4), dtype=np.float32),
+            'tmp2': np.empty((count, 4), dtype=np.float32),
+            'mask': np.empty((count, 3), dtype=bool),
+            'zero': np.empty(count, dtype=bool),
+            'uv': np.empty(count * 2, dtype=np.float32)}
+        return scratch
+
+
+    # In-place array version of blend_values for (N, 4) buffers,
+    # writes top blended over base to out without allocating
+    def blend_into(self, top, base, out, blendmode, blendvalue, scratch):
+        a = np.multiply(top[:, 3:4], blendvalue, out=scratch['a'])
+        inv = np.subtract(1.0, a, out=scratch['inv'])
+        tmp = scratch['tmp']
+
+        if blendmode == 'ALPHA':
+            np.multiply(top, a, out=out)
+            np.multiply(base, inv, out=tmp)
+            out += tmp
+            out[:, 3] += a[:, 0]
+            np.minimum(out[:, 3], 1.0, out=out[:, 3])
+
+        elif blendmode == 'ADD':
+            np.multiply(top, a, out=out)
+            out += base
+            out[:, 3] += a[:, 0]
+            np.minimum(out[:, 3], 1.0, out=out[:, 3])
+
+        elif blendmode == 'MUL':
+            out[:] = base
+            rgb = tmp[:, :3]
+            np.multiply(top[:, :3], a, out=rgb)
+            rgb += inv
+            out[:, :3] *= rgb
+
+        elif blendmode == 'OVR':
+            low = tmp[:, :3]
+            high = scratch['tmp2'][:, :3]
+            np.multiply(base[:, :3], top[:, :3], out=low)
+            low *= 2.0
+            np.subtract(1.0, top[:, :3], out=out[:, :3])
+            np.subtract(1.0, base[:, :3], out=high)
+            high *= out[:, :3]
+            high *= -2.0
+            high += 1.0
+            np.less(base[:, :3], 0.5, out=scratch['mask'])
+            np.copyto(high, low, where=scratch['mask'])
+            np.multiply(high, a, out=out[:, :3])
+            np.multiply(base[:, :3], inv, out=low)
+            out[:, :3] += low
+            np.multiply(top[:, 3], a[:, 0], out=out[:, 3])
+            np.multiply(base[:, 3], inv[:, 0], out=scratch['alpha'])
+            out[:, 3] += scratch['alpha']
+            out[:, 3] += a[:, 0]
+            np.minimum(out[:, 3], 1.0, out=out[:, 3])
+
+        else:
+            out[:] = base
+
+        np.equal(out[:, 3], 0.0, out=scratch['zero'])
+        out[scratch['zero']] = 0.0
+        return out
+
+
     def combine_layers(self, topcolors, basecolors, blendmode):
         count = len(basecolors)//4
         colors = [None] * count * 4
@@ -3372,14 +4674,30 @@ class SXTOOLS_tools(object):
             scene.sxpalettes[palette].color3,
             scene.sxpalettes[palette].color4]
 
+        for idx in range(1, 6):
+            bpy.data.materials['SXMaterial'].node_tree.nodes['PaletteColor'+str(idx-1)].outputs[0].default_value = palette[idx - 1]
+
         for obj in objs:
             for idx in range(1, 6):
                 layer = utils.find_layer_from_index(objs[0], idx)
                 palette_color = palette[idx - 1]
-                bpy.data.materials['SXMaterial'].node_tree.nodes['PaletteColor'+str(idx-1)].outputs[0].default_value = palette_color
-                colors = generate.color_list(obj, color=palette_color, masklayer=layer)
-                if colors is not None:
-                    layers.set_layer(obj, colors, layer)
+
+                # Recolor the palette table instead of every loop,
+                # layers already holding the slot color are left untouched
+                indexed = layers.get_layer_indices(obj, obj.sxlayers[layer.index])
+                if indexed is not None:
+                    used = indexed['counts'] > 0
+                    alphas = indexed['table'][:, 3]
+                    if (alphas[used] != 0.0).any():
+                        table = np.empty_like(indexed['table'])
+                        table[:] = palette_color[:]
+                        table[:, 3] *= alphas
+                        if not np.array_equal(table[used], indexed['table'][used]):
+                            layers.set_layer_indices(obj, obj.sxlayers[layer.index], indexed['indices'], table)
+                else:
+                    colors = generate.color_list(obj, color=palette_color, masklayer=layer)
+                    if colors is not None:
+                        layers.set_layer(obj, colors, layer)
 
         sxglobals.refreshInProgress = False
         utils.mode_manager(objs, revert=True, mode_id='apply_palette')
@@ -3607,7 +4925,7 @@ class SXTOOLS_tools(object):
 
         for obj in objs:
             if obj.parent is None:
-                obj.parent = group
+                utils.set_parent(obj, group)
                 obj.location.x -= group.location.x
                 obj.location.y -= group.location.y
                 obj.location.z -= group.location.z
@@ -3861,28 +5179,22 @@ class SXTOOLS_validate(object):
     def test_palette_layers(self, objs):
         for obj in objs:
             if obj.sxtools.category != 'DEFAULT':
-                mesh = obj.data
                 for i in range(5):
-                    colorArray = []
+                    # More than 256 colors never passes, so palette indices suffice,
+                    # None marks a layer with too many colors to index
                     layer = utils.find_layer_from_index(obj, i+1)
-                    vertexColors = mesh.attributes[layer.vertexColorLayer].data
-
-                    for poly in mesh.polygons:
-                        for loop_idx in poly.loop_indices:
-                            colorArray.append(vertexColors[loop_idx].color[:])
-
-                    colorSet = set(colorArray)
-
-                    if i == 0:
-                        if len(colorSet) > 1:
-                            print(f'SX Tools Error: Multiple colors in {obj.name} layer {i+1}')
-                            message_box('Multiple colors in ' + obj.name + ' layer' + str(i+1))
-                            return False
+                    indexed = layers.get_layer_indices(obj, layer)
+                    if indexed is None:
+                        colorSet = None
                     else:
-                        if len(colorSet) > 2:
-                            print(f'SX Tools Error: Multiple colors in {obj.name} layer {i+1}')
-                            message_box('Multiple colors in ' + obj.name + ' layer' + str(i+1))
-                            return False
+                        table = indexed['table'][indexed['counts'] > 0]
+                        colorSet = set([tuple(color) for color in table.tolist()])
+
+                    maxColors = 1 if i == 0 else 2
+                    if (colorSet is None) or (len(colorSet) > maxColors):
+                        print(f'SX Tools Error: Multiple colors in {obj.name} layer {i+1}')
+                        message_box('Multiple colors in ' + obj.name + ' layer' + str(i+1))
+                        return False
         return True
 
 
@@ -3917,7 +5229,16 @@ class SXTOOLS_magic(object):
     # These should be adapted to the needs of the game,
     # baking category-specific values to achieve
     # consistent project-wide looks.
+    # Batch processing rewrites most layers, leave it to global undo
     def process_objects(self, objs):
+        sxglobals.undoJournal['suspended'] = True
+        try:
+            self.process_batch(objs)
+        finally:
+            sxglobals.undoJournal['suspended'] = False
+
+
+    def process_batch(self, objs):
         if not sxglobals.refreshInProgress:
             sxglobals.refreshInProgress = True
 
@@ -3925,6 +5246,7 @@ class SXTOOLS_magic(object):
         scene = bpy.context.scene.sxtools
         viewlayer = bpy.context.view_layer
         orgObjNames = {}
+        layers.clear_composite_cache()
 
         org_toolmode = scene.toolmode
         org_toolopacity = scene.toolopacity
@@ -4008,6 +5330,9 @@ class SXTOOLS_magic(object):
                 sourceObjects.objects.link(orgGroup)
                 exportObjects.objects.link(group)
 
+            # Export copies take over the original names, so drop
+            # anything cached under them before renaming
+            layers.clear_composite_cache(objs)
             for obj in objs:
                 if obj.name not in sourceObjects.objects:
                     sourceObjects.objects.link(obj)
@@ -4027,7 +5352,7 @@ class SXTOOLS_magic(object):
                 else:
                     newObjs.append(newObj)
 
-                obj.parent = viewlayer.objects[obj.parent.name + '_org']
+                utils.set_parent(obj, viewlayer.objects[obj.parent.name + '_org'])
 
             if len(lodObjs) > 0:
                 newObjArray = export.generate_lods(lodObjs)
@@ -4072,6 +5397,9 @@ class SXTOOLS_magic(object):
                     categoryObjs.append(obj)
 
             if len(categoryObjs) > 0:
+                sxglobals.bakeVertexCount = 0
+                sxglobals.bakeUniqueCount = 0
+                sxglobals.bakeMirrorCount = 0
                 groupList = utils.find_groups(categoryObjs)
                 for group in groupList:
                     createLODs = False
@@ -4117,8 +5445,13 @@ class SXTOOLS_magic(object):
                                     else:
                                         # obj.select_set(False)
                                         obj.hide_viewport = True
+                                if len(lodObjs) == 0:
+                                    continue
                                 viewlayer.objects.active = lodObjs[0]
-                                self.process_vehicles(lodObjs)
+                                if (i > 0) and utils.category_lod_transfer(category):
+                                    self.process_lod_transfer(lodObjs, groupObjs, i)
+                                else:
+                                    self.process_vehicles(lodObjs)
                         else:
                             self.process_vehicles(groupObjs)
                     elif category == 'BUILDINGS':
@@ -4151,7 +5484,11 @@ class SXTOOLS_magic(object):
                         obj.hide_viewport = True
 
                 now = time.perf_counter()
-                print(f'SX Tools: {category} / {len(groupList)} groups duration: {now-then} seconds')
+                if sxglobals.bakeVertexCount > 0:
+                    dedupRatio = 1.0 - sxglobals.bakeUniqueCount / sxglobals.bakeVertexCount
+                    print(f'SX Tools: {category} / {len(groupList)} groups duration: {now-then} seconds, baked {sxglobals.bakeUniqueCount} / {sxglobals.bakeVertexCount} vertices (dedup ratio {dedupRatio:.2f}, {sxglobals.bakeMirrorCount} mirrored)')
+                else:
+                    print(f'SX Tools: {category} / {len(groupList)} groups duration: {now-then} seconds')
 
         for obj in viewlayer.objects:
             if (scene.exportquality == 'HI') and ('_org' in obj.name):
@@ -4212,6 +5549,7 @@ class SXTOOLS_magic(object):
         print(f'SX Tools: Modifier stack duration: {now-then} seconds')
 
         utils.mode_manager(objs, revert=True, mode_id='process_objects')
+        layers.clear_composite_cache(objs)
         sxglobals.refreshInProgress = False
 
 
@@ -4561,6 +5899,36 @@ class SXTOOLS_magic(object):
                 layers.set_layer(obj, colors, obj.sxlayers['metallic'])
 
 
+    # Projects baked channels from LOD0 meshes to their lower LOD counterparts
+    def process_lod_transfer(self, objs, groupObjs, lod):
+        print(f'SX Tools: Transferring LOD0 bakes to LOD{lod}')
+        layerNames = ['occlusion', 'overlay', 'metallic', 'smoothness', 'transmission']
+        sourceDict = {}
+        for obj in groupObjs:
+            if '_LOD0' in obj.name:
+                sourceDict[obj.name.replace('_LOD0', '_LOD'+str(lod))] = obj
+
+        for obj in objs:
+            sourceObj = sourceDict.get(obj.name)
+            if sourceObj is None:
+                print(f'SX Tools Error: No LOD0 source for {obj.name}, baking instead')
+                self.process_vehicles([obj, ])
+                continue
+
+            # The face mapping only depends on the meshes, so it is shared by all layers
+            mapping = None
+            for layerName in layerNames:
+                if (layerName in obj.sxlayers.keys()) and obj.sxlayers[layerName].enabled:
+                    sourceLayer = sourceObj.sxlayers[layerName]
+                    layer = obj.sxlayers[layerName]
+                    if mapping is None:
+                        mapping = generate.transfer_mapping(obj, sourceObj)
+                    colors = generate.transfer_list(obj, sourceObj, sourceLayer, mapping=mapping)
+                    layers.set_layer(obj, colors, layer)
+                    layer.blendMode = sourceLayer.blendMode
+                    layer.alpha = sourceLayer.alpha
+
+
     def process_buildings(self, objs):
         print('SX Tools: Processing Buildings')
         scene = bpy.context.scene.sxtools
@@ -4879,7 +6247,7 @@ class SXTOOLS_export(object):
                             if mirror_pair[0] in obj.name:
                                 if mirror_pair[1] in obj.parent.name:
                                     new_parent_name = obj.parent.name.replace(mirror_pair[1], mirror_pair[0])
-                                    obj.parent = view_layer.objects[new_parent_name]
+                                    utils.set_parent(obj, view_layer.objects[new_parent_name])
                                     obj.matrix_parent_inverse = obj.parent.matrix_world.inverted()
 
                 view_layer.objects.active = active
@@ -4950,7 +6318,7 @@ class SXTOOLS_export(object):
                         bpy.context.scene.collection.objects.link(newObj)
                         exportObjects.objects.link(newObj)
 
-                        newObj.parent = bpy.context.view_layer.objects[obj.parent.name]
+                        utils.set_parent(newObj, bpy.context.view_layer.objects[obj.parent.name])
 
                         bpy.ops.object.select_all(action='DESELECT')
                         newObj.select_set(True)
@@ -5018,7 +6386,7 @@ class SXTOOLS_export(object):
             bpy.context.scene.collection.objects.link(newObj)
             collisionSourceObjects.objects.link(newObj)
 
-            newObj.parent = bpy.context.view_layer.objects[obj.parent.name]
+            utils.set_parent(newObj, bpy.context.view_layer.objects[obj.parent.name])
 
             newObj.sxtools.subdivisionlevel = scene.sourcesubdivision
 
@@ -5090,6 +6458,7 @@ class SXTOOLS_export(object):
             for i in range(count):
                 vcolors[(0+i*4):(4+i*4)] = convert.srgb_to_linear(vcolors[(0+i*4):(4+i*4)])
             layers.set_colors(obj, 'VertexColor0', vcolors)
+            layers.bump_layer_version(obj, utils.find_layer_from_index(obj, 0))
 
 
     def export_to_srgb(self, objs):
@@ -5099,17 +6468,20 @@ class SXTOOLS_export(object):
             for i in range(count):
                 vcolors[(0+i*4):(4+i*4)] = convert.linear_to_srgb(vcolors[(0+i*4):(4+i*4)])
             layers.set_colors(obj, 'VertexColor0', vcolors)
+            layers.bump_layer_version(obj, utils.find_layer_from_index(obj, 0))
 
 
     def remove_exports(self):
         if 'ExportObjects' in bpy.data.collections:
             exportObjects = bpy.data.collections['ExportObjects'].objects
+            layers.clear_composite_cache(exportObjects)
             for obj in exportObjects:
                 bpy.data.objects.remove(obj, do_unlink=True)
 
         if 'SourceObjects' in bpy.data.collections:
             sourceObjects = bpy.data.collections['SourceObjects'].objects
             tags = sxglobals.keywords
+            restoredObjs = sourceObjects[:]
             for obj in sourceObjects:
                 if obj.type == 'MESH':
                     name = obj.name[:]
@@ -5130,6 +6502,9 @@ class SXTOOLS_export(object):
                 obj.hide_viewport = False
                 sourceObjects.unlink(obj)
 
+            # Originals take back names the export copies used
+            layers.clear_composite_cache(restoredObjs)
+
 
     def __del__(self):
         print('SX Tools: Exiting export')
@@ -5181,8 +6556,7 @@ def update_layers(self, context):
 
             # setup.setup_geometry(objs)
             if not context.scene.sxtools.gpucomposite:
-                sxglobals.composite = True
-                layers.composite_layers(objs)
+                schedule_refresh(actives=False, composite=True)
 
             utils.mode_manager(objs, revert=True, mode_id='update_layers')
 
@@ -5250,6 +6624,128 @@ def refresh_actives(self, context):
         sxglobals.refreshInProgress = False
 
 
+# Coalesces refresh requests from property updates, a slider drag
+# then costs one refresh per tick instead of one per update
+# Tasks are (key, function, args), a later task with the
+# same key replaces the pending one so only the latest value is applied
+# Timers are matched by function identity, a bound method
+# would be a new object on every access and never unregister
+def close_journal_step():
+    return journal.close_step()
+
+
+def schedule_refresh(actives=True, composite=False, task=None):
+    queue = sxglobals.refreshQueue
+    queue['actives'] = queue['actives'] or actives
+    queue['composite'] = queue['composite'] or composite
+    if task is not None:
+        queue['tasks'][task[0]] = task[1:]
+
+    if bpy.app.background:
+        run_scheduled_refresh()
+    elif not queue['scheduled']:
+        queue['scheduled'] = True
+        bpy.app.timers.register(run_scheduled_refresh, first_interval=sxglobals.refreshInterval)
+
+
+# Timers run without a window or area, mode changes need both
+def refresh_context_override():
+    for window in bpy.context.window_manager.windows:
+        for area in window.screen.areas:
+            if area.type == 'VIEW_3D':
+                return {'window': window, 'area': area}
+    return None
+
+
+def run_scheduled_refresh():
+    queue = sxglobals.refreshQueue
+    override = {} if bpy.app.background else refresh_context_override()
+    if override is None:
+        # Without a 3D view, keep work that would have to leave
+        # the current mode queued and check again later
+        objs = selection_validator(None, bpy.context)
+        if (len(objs) > 0) and (objs[0].mode != 'OBJECT'):
+            return sxglobals.refreshInterval
+        override = {}
+
+    actives = queue['actives']
+    composite = queue['composite']
+    tasks = queue['tasks']
+    queue.update({'scheduled': False, 'actives': False, 'composite': False, 'tasks': {}})
+
+    with bpy.context.temp_override(**override):
+        context = bpy.context
+        for function, args in tasks.values():
+            function(context, *args)
+
+        if composite:
+            sxglobals.composite = True
+
+        # refresh_actives also composites and updates the material
+        if actives:
+            refresh_actives(None, context)
+        elif composite and not context.scene.sxtools.gpucomposite:
+            objs = selection_validator(None, context)
+            if len(objs) > 0:
+                utils.mode_manager(objs, set_mode=True, mode_id='run_scheduled_refresh')
+                layers.composite_layers(objs)
+                utils.mode_manager(objs, revert=True, mode_id='run_scheduled_refresh')
+    return None
+
+
+# Desired sources for the SXMaterial inputs that shading_mode manages,
+# None means the input is disconnected
+def shading_link_state(mode, metallic, smoothness, transmission, emission, materialtransmission, materialsubsurface):
+    if mode == 'FULL':
+        state = {
+            ('Mix', 6): ('Composite Color', 'Color'),
+            ('Principled BSDF', 'Base Color'): ('Mix', 2),
+            ('Principled BSDF', 'Metallic'): ('VisMix 2', 'Color') if metallic else None,
+            ('Principled BSDF', 'Roughness'): ('VisMix 3', 'Color') if smoothness else None,
+            ('Principled BSDF', 'Transmission'): ('VisMix 4', 'Color') if (transmission and materialtransmission) else None,
+            ('Principled BSDF', 'Subsurface'): ('VisMix 4', 'Color') if (transmission and materialsubsurface) else None,
+            ('Principled BSDF', 'Emission'): ('VisMix 5', 'Color') if emission else None}
+        if emission:
+            state[('Mix.001', 6)] = ('Mix', 2)
+    else:
+        state = {
+            ('Mix', 6): None,
+            ('Principled BSDF', 'Base Color'): None,
+            ('Principled BSDF', 'Metallic'): None,
+            ('Principled BSDF', 'Roughness'): None,
+            ('Principled BSDF', 'Transmission'): None,
+            ('Principled BSDF', 'Subsurface'): None,
+            ('Principled BSDF', 'Emission'): ('Composite Color', 'Color')}
+    return state
+
+
+# Only differing links are touched, each change recompiles the shader
+def apply_link_state(nodetree, state):
+    nodes = nodetree.nodes
+    for (nodeName, inputKey), source in state.items():
+        node = nodes.get(nodeName)
+        if node is None:
+            continue
+        socket = node.inputs[inputKey]
+        current = socket.links[0].from_socket if socket.is_linked else None
+
+        if source is None:
+            if current is not None:
+                nodetree.links.remove(socket.links[0])
+        else:
+            sourceNode = nodes.get(source[0])
+            if sourceNode is None:
+                continue
+            output = sourceNode.outputs[source[1]]
+            if (current is None) or (current.as_pointer() != output.as_pointer()):
+                nodetree.links.new(socket, output)
+
+
+def set_if_changed(target, attribute, value):
+    if getattr(target, attribute) != value:
+        setattr(target, attribute, value)
+
+
 def shading_mode(self, context):
     prefs = bpy.context.preferences.addons['sxtools'].preferences
     mode = context.scene.sxtools.shadingmode
@@ -5257,16 +6753,19 @@ def shading_mode(self, context):
 
     if len(objs) > 0:
         sxmaterial = bpy.data.materials['SXMaterial']
+        eevee = context.scene.eevee
+        shading = 'MATERIAL'  # 'WIREFRAME' 'SOLID' 'MATERIAL' 'RENDERED'
+        spaces = []
+        for area in bpy.context.workspace.screens[0].areas:
+            for space in area.spaces:
+                if space.type == 'VIEW_3D':
+                    spaces.append(space)
 
         if prefs.materialtype == 'SMP':
-            context.scene.eevee.use_bloom = False
-            context.scene.eevee.use_ssr = False
-            areas = bpy.context.workspace.screens[0].areas
-            shading = 'MATERIAL'  # 'WIREFRAME' 'SOLID' 'MATERIAL' 'RENDERED'
-            for area in areas:
-                for space in area.spaces:
-                    if space.type == 'VIEW_3D':
-                        space.shading.type = shading
+            set_if_changed(eevee, 'use_bloom', False)
+            set_if_changed(eevee, 'use_ssr', False)
+            for space in spaces:
+                set_if_changed(space.shading, 'type', shading)
 
         else:
             occlusion = objs[0].sxlayers['occlusion'].enabled
@@ -5280,108 +6779,26 @@ def shading_mode(self, context):
 
             if mode == 'FULL':
                 if emission:
-                    context.scene.eevee.use_bloom = True
+                    set_if_changed(eevee, 'use_bloom', True)
                 if metallic or smoothness:
-                    context.scene.eevee.use_ssr = True
-                areas = bpy.context.workspace.screens[0].areas
-                shading = 'MATERIAL'  # 'WIREFRAME' 'SOLID' 'MATERIAL' 'RENDERED'
-                for area in areas:
-                    for space in area.spaces:
-                        if space.type == 'VIEW_3D':
-                            if ((space.shading.type == 'WIREFRAME') or
-                               (space.shading.type == 'SOLID')):
-                                space.shading.type = shading
-
-                sxmaterial.node_tree.nodes['Principled BSDF'].inputs['Specular'].default_value = 0.5
-
-                # Disconnect vertex color output from emission
-                attrLink = sxmaterial.node_tree.nodes['Composite Color'].outputs[0].links[0]
-                sxmaterial.node_tree.links.remove(attrLink)
-
-                # Reconnect vertex color to mixer
-                output = sxmaterial.node_tree.nodes['Composite Color'].outputs['Color']
-                input = sxmaterial.node_tree.nodes['Mix'].inputs[6]
-                sxmaterial.node_tree.links.new(input, output)
-
-                # Reconnect mixer to base color
-                output = sxmaterial.node_tree.nodes['Mix'].outputs[2]
-                input = sxmaterial.node_tree.nodes['Principled BSDF'].inputs['Base Color']
-                sxmaterial.node_tree.links.new(input, output)
-
-                if metallic:
-                    # Reconnect metallic and roughness
-                    output = sxmaterial.node_tree.nodes['VisMix 2'].outputs['Color']
-                    input = sxmaterial.node_tree.nodes['Principled BSDF'].inputs['Metallic']
-                    sxmaterial.node_tree.links.new(input, output)
-
-                if smoothness:
-                    output = sxmaterial.node_tree.nodes['VisMix 3'].outputs['Color']
-                    input = sxmaterial.node_tree.nodes['Principled BSDF'].inputs['Roughness']
-                    sxmaterial.node_tree.links.new(input, output)
-
-                if transmission:
-                    if materialtransmission:
-                        # Reconnect transmission
-                        output = sxmaterial.node_tree.nodes['VisMix 4'].outputs['Color']
-                        input = sxmaterial.node_tree.nodes['Principled BSDF'].inputs['Transmission']
-                        sxmaterial.node_tree.links.new(input, output)
-
-                    if materialsubsurface:
-                        output = sxmaterial.node_tree.nodes['VisMix 4'].outputs['Color']
-                        input = sxmaterial.node_tree.nodes['Principled BSDF'].inputs['Subsurface']
-                        sxmaterial.node_tree.links.new(input, output)
-
-                if emission:
-                    # Reconnect emission
-                    output = sxmaterial.node_tree.nodes['VisMix 5'].outputs['Color']
-                    input = sxmaterial.node_tree.nodes['Principled BSDF'].inputs['Emission']
-                    sxmaterial.node_tree.links.new(input, output)
-
-                    # Reconnect base mix
-                    output = sxmaterial.node_tree.nodes['Mix'].outputs[2]
-                    input = sxmaterial.node_tree.nodes['Mix.001'].inputs[6]
-                    sxmaterial.node_tree.links.new(input, output)
+                    set_if_changed(eevee, 'use_ssr', True)
+                for space in spaces:
+                    if ((space.shading.type == 'WIREFRAME') or
+                       (space.shading.type == 'SOLID')):
+                        space.shading.type = shading
+                set_if_changed(sxmaterial.node_tree.nodes['Principled BSDF'].inputs['Specular'], 'default_value', 0.5)
 
             else:
                 if emission:
-                    context.scene.eevee.use_bloom = False
+                    set_if_changed(eevee, 'use_bloom', False)
                 if metallic or smoothness:
-                    context.scene.eevee.use_ssr = False
-                areas = bpy.context.workspace.screens[0].areas
-                shading = 'MATERIAL'  # 'WIREFRAME' 'SOLID' 'MATERIAL' 'RENDERED'
-                for area in areas:
-                    for space in area.spaces:
-                        if space.type == 'VIEW_3D':
-                            space.shading.type = shading
-
-                sxmaterial.node_tree.nodes['Principled BSDF'].inputs['Specular'].default_value = 0.0
-
-                # Disconnect base color, metallic and roughness
-                attrLink = sxmaterial.node_tree.nodes['Composite Color'].outputs[0].links[0]
-                sxmaterial.node_tree.links.remove(attrLink)
-
-                # Check if already debug
-                if sxglobals.prevShadingMode == 'FULL':
-                    attrLink = sxmaterial.node_tree.nodes['Mix'].outputs[2].links[0]
-                    sxmaterial.node_tree.links.remove(attrLink)
-                    if metallic:
-                        attrLink = sxmaterial.node_tree.nodes['VisMix 2'].outputs[0].links[0]
-                        sxmaterial.node_tree.links.remove(attrLink)
-                    if smoothness:
-                        attrLink = sxmaterial.node_tree.nodes['VisMix 3'].outputs[0].links[0]
-                        sxmaterial.node_tree.links.remove(attrLink)
-                    if transmission:
-                        if materialtransmission and materialsubsurface:
-                            attrLink = sxmaterial.node_tree.nodes['VisMix 4'].outputs[0].links[1]
-                            sxmaterial.node_tree.links.remove(attrLink)
-                        if materialtransmission or materialsubsurface:
-                            attrLink = sxmaterial.node_tree.nodes['VisMix 4'].outputs[0].links[0]
-                            sxmaterial.node_tree.links.remove(attrLink)
-
-                # Connect vertex color source to emission
-                output = sxmaterial.node_tree.nodes['Composite Color'].outputs['Color']
-                input = sxmaterial.node_tree.nodes['Principled BSDF'].inputs['Emission']
-                sxmaterial.node_tree.links.new(input, output)
+                    set_if_changed(eevee, 'use_ssr', False)
+                for space in spaces:
+                    set_if_changed(space.shading, 'type', shading)
+                set_if_changed(sxmaterial.node_tree.nodes['Principled BSDF'].inputs['Specular'], 'default_value', 0.0)
+
+            state = shading_link_state(mode, metallic, smoothness, transmission, emission, materialtransmission, materialsubsurface)
+            apply_link_state(sxmaterial.node_tree, state)
 
             sxglobals.prevShadingMode = mode
 
@@ -5401,26 +6818,51 @@ def selection_validator(self, context):
     return list(set(selObjs))
 
 
+# Validated selection for draw code, re-validated only
+# when the selection generation or selected names change
+def cached_selection(self, context):
+    key = (sxglobals.selectionGeneration, tuple(context.view_layer.objects.selected.keys()))
+    cache = sxglobals.selectionContext
+    if cache['key'] != key:
+        cache['key'] = key
+        cache['objs'] = selection_validator(self, context)
+    return cache['objs']
+
+
 def dict_lister(self, context, data_dict):
-    items = data_dict.keys()
+    key = ('dict', id(data_dict))
+    cached = sxglobals.enumCache.get(key)
+    if (cached is not None) and (cached[0] == (sxglobals.libraryVersion, len(data_dict))):
+        return cached[1]
+
     enumItems = []
-    for item in items:
+    for item in data_dict.keys():
         sxglobals.presetLookup[item.replace(" ", "_").upper()] = item
         enumItem = (item.replace(" ", "_").upper(), item, '')
         enumItems.append(enumItem)
+    sxglobals.enumCache[key] = ((sxglobals.libraryVersion, len(data_dict)), enumItems)
     return enumItems
 
 
 def ext_category_lister(self, context, category):
     items = getattr(context.scene, category)
-    categories = []
+    key = (category, context.scene.name)
+    cached = sxglobals.enumCache.get(key)
+    if (cached is not None) and (cached[0] == (sxglobals.libraryVersion, len(items))):
+        return cached[1]
+
+    # Dedupe in library order so enum indices stay stable
+    enumItems = []
+    seen = set()
     for item in items:
         categoryEnum = item.category.replace(" ", "").upper()
         if categoryEnum not in sxglobals.presetLookup:
             sxglobals.presetLookup[categoryEnum] = item.category
         enumItem = (categoryEnum, item.category, '')
-        categories.append(enumItem)
-    enumItems = list(set(categories))
+        if enumItem not in seen:
+            seen.add(enumItem)
+            enumItems.append(enumItem)
+    sxglobals.enumCache[key] = ((sxglobals.libraryVersion, len(items)), enumItems)
     return enumItems
 
 
@@ -5435,11 +6877,14 @@ def load_category(self, context):
                 for i in range(7):
                     layer = utils.find_layer_from_index(obj, i+1)
                     layer.name = categoryData[i]
+                utils.clear_layer_maps([obj, ])
 
                 obj.sxtools.staticvertexcolors = str(categoryData[7])
                 obj.sxtools.smoothness1 = categoryData[8]
                 obj.sxtools.smoothness2 = categoryData[9]
                 obj.sxtools.overlaystrength = categoryData[10]
+                if len(categoryData) > 12:
+                    obj.sxtools.lodtransfer = bool(categoryData[12])
                 obj.sxtools.selectedlayer = 1
 
             bpy.data.materials['SXMaterial'].blend_method = categoryData[11]
@@ -5483,21 +6928,30 @@ def load_libraries(self, context):
     if status1 and status2 and status3 and status4:
         message_box('Libraries loaded successfully')
         sxglobals.librariesLoaded = True
+        sxglobals.libraryRetry['failures'] = 0
+        sxglobals.libraryRetry['next'] = 0.0
+    else:
+        # Wait longer after each failed attempt, up to a minute
+        sxglobals.libraryRetry['failures'] += 1
+        sxglobals.libraryRetry['next'] = time.time() + min(2 ** sxglobals.libraryRetry['failures'], 60)
 
 
+# Slider drags are coalesced, the layer is adjusted
+# once per refresh tick with the latest slider value
 def adjust_hsl(self, context, hslmode):
     if not sxglobals.hslUpdate:
-        objs = selection_validator(self, context)
-        hslvalues = [context.scene.sxtools.huevalue, context.scene.sxtools.saturationvalue, context.scene.sxtools.lightnessvalue]
+        schedule_refresh(composite=True, task=(('hsl', hslmode), apply_hsl_task, (hslmode, )))
 
-        if len(objs) > 0:
-            idx = objs[0].sxtools.selectedlayer
-            layer = utils.find_layer_from_index(objs[0], idx)
 
-            tools.apply_hsl(objs, layer, hslmode, hslvalues[hslmode])
+def apply_hsl_task(context, hslmode):
+    objs = selection_validator(None, context)
+    hslvalues = [context.scene.sxtools.huevalue, context.scene.sxtools.saturationvalue, context.scene.sxtools.lightnessvalue]
 
-            sxglobals.composite = True
-            refresh_actives(self, context)
+    if len(objs) > 0:
+        idx = objs[0].sxtools.selectedlayer
+        layer = utils.find_layer_from_index(objs[0], idx)
+
+        journal.recorded(tools.apply_hsl, objs, layer, hslmode, hslvalues[hslmode])
 
 
 def update_modifiers(self, context, prop):
@@ -5664,6 +7118,20 @@ def update_custom_props(self, context, prop):
             load_category(self, context)
 
 
+# Mirrors the category setting on the objects and saves it to categories.json
+def update_lod_transfer(self, context):
+    update_custom_props(self, context, 'lodtransfer')
+    if not sxglobals.refreshInProgress:
+        objs = selection_validator(self, context)
+        if len(objs) > 0:
+            categoryData = sxglobals.categoryDict[sxglobals.presetLookup[objs[0].sxtools.category]]
+            if len(categoryData) > 12:
+                categoryData[12] = objs[0].sxtools.lodtransfer
+            else:
+                categoryData.append(objs[0].sxtools.lodtransfer)
+            files.save_file('categories')
+
+
 def update_gpu_props(self, context):
     mode = context.scene.sxtools.shadingmode
     objs = selection_validator(self, context)
@@ -5705,9 +7173,17 @@ def update_smooth_angle(self, context):
                 obj.data.auto_smooth_angle = smoothAngle
 
 
+# Palette values synced from the layers during a refresh need no layer update
 def update_palette_layer(self, context, index):
+    if not sxglobals.refreshInProgress:
+        schedule_refresh(composite=True, task=(('palette', index), apply_palette_layer_task, (index, )))
+
+
+def apply_palette_layer_task(context, index):
     scene = context.scene.sxtools
-    objs = selection_validator(self, context)
+    objs = selection_validator(None, context)
+    if len(objs) == 0:
+        return
     layer = utils.find_layer_from_index(objs[0], index + 1)
     color = getattr(scene, 'newpalette'+str(index))
 
@@ -5723,10 +7199,7 @@ def update_palette_layer(self, context, index):
             colors = generate.color_list(obj, color, masklayer=layer)
 
             if colors is not None:
-                layers.set_layer(obj, colors, layer)
-
-    sxglobals.composite = True
-    refresh_actives(self, context)
+                journal.recorded(layers.set_layer, obj, colors, layer)
 
 
 def update_material_layer(self, context, index):
@@ -5766,18 +7239,18 @@ def update_material_layer(self, context, index):
 
         if not utils.color_compare(modecolor, pbr_values[index]):
             if sxglobals.mode == 'EDIT':
-                tools.apply_tool(objs, objs[0].sxlayers[layer_ids[index]], color=pbr_values[index])
+                journal.recorded(tools.apply_tool, objs, objs[0].sxlayers[layer_ids[index]], color=pbr_values[index])
             else:
-                tools.apply_tool(objs, objs[0].sxlayers[layer_ids[index]], masklayer=objs[0].sxlayers[layer_ids[0]], color=pbr_values[index])
+                journal.recorded(tools.apply_tool, objs, objs[0].sxlayers[layer_ids[index]], masklayer=objs[0].sxlayers[layer_ids[0]], color=pbr_values[index])
 
             setattr(scene, 'newmaterial' + str(index), pbr_values[index])
 
         utils.mode_manager(objs, revert=True, mode_id='update_material_layer')
         sxglobals.matUpdate = False
 
-        if index == 0:
-            sxglobals.composite = True
-    refresh_actives(self, context)
+        schedule_refresh(composite=(index == 0))
+    else:
+        schedule_refresh()
 
 
 def update_fillcolor(self, context):
@@ -5899,10 +7372,50 @@ def update_curvature_selection(self, context):
         sxglobals.curvatureUpdate = False
 
 
+def mark_selection_dirty(*args):
+    sxglobals.selectionDirty = True
+    sxglobals.selectionGeneration += 1
+
+
+def subscribe_selection_events():
+    bpy.msgbus.clear_by_owner(sxglobals.msgbusOwner)
+    bpy.msgbus.subscribe_rna(
+        key=(bpy.types.LayerObjects, 'active'),
+        owner=sxglobals.msgbusOwner,
+        args=(),
+        notify=mark_selection_dirty)
+
+
+# Selection, mode and geometry changes all pass through the depsgraph,
+# updates caused by SX Tools refreshes and layer writes are skipped
+@persistent
+def depsgraph_update_handler(scene, depsgraph):
+    written = sxglobals.pendingWrites
+    sxglobals.pendingWrites = set()
+
+    for update in depsgraph.updates:
+        if update.is_updated_geometry and (update.id.original.name in written):
+            continue
+
+        # Objects added, removed or reparented
+        if isinstance(update.id, (bpy.types.Object, bpy.types.Collection, bpy.types.Scene)):
+            utils.clear_hierarchy_index()
+
+        if not sxglobals.refreshInProgress:
+            mark_selection_dirty()
+
+
 @persistent
 def load_post_handler(dummy):
     sxglobals.prevShadingMode = 'FULL'
     sxglobals.librariesLoaded = False
+    sxglobals.libraryRetry['next'] = 0.0
+    sxglobals.selectionDirty = True
+    layers.clear_composite_cache()
+    utils.clear_hierarchy_index()
+    utils.clear_layer_maps()
+    journal.clear()
+    subscribe_selection_events()
 
     if bpy.data.scenes['Scene'].sxtools.rampmode == '':
         bpy.data.scenes['Scene'].sxtools.rampmode = 'X'
@@ -5945,6 +7458,18 @@ def load_post_handler(dummy):
     setup.start_modal()
 
 
+# Undo and redo restore layer data behind the composite cache
+# and the layer journal, and invalidate the cached StructRNA
+# references of the selection
+@persistent
+def undo_post_handler(dummy):
+    layers.clear_composite_cache()
+    journal.clear()
+    utils.clear_hierarchy_index()
+    utils.clear_layer_maps()
+    mark_selection_dirty()
+
+
 # Update revision IDs and save in asset catalogue
 @persistent
 def save_pre_handler(dummy):
@@ -5960,7 +7485,6 @@ def save_pre_handler(dummy):
 
 @persistent
 def save_post_handler(dummy):
-    catalogue_dict = {}
     revision = 1
     prefs = bpy.context.preferences.addons['sxtools'].preferences
 
@@ -5978,27 +7502,24 @@ def save_post_handler(dummy):
 
 
     if len(prefs.cataloguepath) > 0:
-        try:
-            with open(prefs.cataloguepath, 'r') as input:
-                catalogue_dict = json.load(input)
-                input.close()
-
-            file_path = bpy.data.filepath
-            asset_path = os.path.split(prefs.cataloguepath)[0]
-            # prefix = os.path.commonpath([asset_path, file_path])
-            # file_rel_path = os.path.relpath(file_path, asset_path)
-
-            for category in catalogue_dict:
-                for key in catalogue_dict[category]:
-                    key_path = key.replace('//', os.path.sep)
-                    if os.path.samefile(file_path, os.path.join(asset_path, key_path)):
-                        catalogue_dict[category][key]['revision'] = str(revision)
-                        catalogue_dict[category][key]['cost'] = cost
+        file_path = bpy.data.filepath
 
-            with open(prefs.cataloguepath, 'w') as output:
-                json.dump(catalogue_dict, output, indent=4)
-                output.close()
+        def update_revision(catalogue_dict, index):
+            changed = False
+            for category, key in index.get(catalogue.normalize(file_path), []):
+                entry = catalogue_dict[category][key]
+                if (entry.get('revision') != str(revision)) or (entry.get('cost') != cost):
+                    entry['revision'] = str(revision)
+                    entry['cost'] = cost
+                    changed = True
+            return changed
 
+        try:
+            # Files not in the catalogue only need the cached index
+            if len(catalogue.entries(prefs.cataloguepath, file_path)) == 0:
+                return
+            if catalogue.update(prefs.cataloguepath, update_revision) is None:
+                message_box('Asset Catalogue is locked by another session.', 'SX Tools Error', 'ERROR')
         except (ValueError, IOError) as error:
             message_box('Failed to update file revision in Asset Catalogue file.', 'SX Tools Error', 'ERROR')
             return False, None
@@ -6073,6 +7594,13 @@ class SXTOOLS_preferences(bpy.types.AddonPreferences):
         maxlen=1024,
         subtype='FILE_PATH')
 
+    undomemory: bpy.props.IntProperty(
+        name='Layer Undo Memory (MB)',
+        description='Memory cap for the SX layer undo journal\nOldest steps are dropped first',
+        min=1,
+        max=4096,
+        default=256)
+
 
     def draw(self, context):
         layout = self.layout
@@ -6102,6 +7630,9 @@ class SXTOOLS_preferences(bpy.types.AddonPreferences):
         layout_split10 = layout.split()
         layout_split10.label(text='Catalogue File (Optional):')
         layout_split10.prop(self, 'cataloguepath', text='')
+        layout_split11 = layout.split()
+        layout_split11.label(text='Layer Undo Memory (MB):')
+        layout_split11.prop(self, 'undomemory', text='')
 
 
 class SXTOOLS_objectprops(bpy.types.PropertyGroup):
@@ -6162,6 +7693,12 @@ class SXTOOLS_objectprops(bpy.types.PropertyGroup):
         default=False,
         update=lambda self, context: update_modifiers(self, context, 'zmirror'))
 
+    mirrorocclusion: bpy.props.BoolProperty(
+        name='Mirror-Aware Occlusion',
+        description='Bake local occlusion on one half of mirrored geometry\nand copy the results to the mirrored vertices',
+        default=False,
+        update=lambda self, context: update_custom_props(self, context, 'mirrorocclusion'))
+
     smartseparate: bpy.props.BoolProperty(
         name='Smart Separate',
         default=False,
@@ -6265,6 +7802,12 @@ class SXTOOLS_objectprops(bpy.types.PropertyGroup):
         default=False,
         update=lambda self, context: update_custom_props(self, context, 'lodmeshes'))
 
+    lodtransfer: bpy.props.BoolProperty(
+        name='Transfer LOD Bakes',
+        description='Bake LOD0 only and transfer occlusion, overlay\nand material channels to lower LODs.\nStored as a category setting',
+        default=False,
+        update=update_lod_transfer)
+
     pivotmode: bpy.props.EnumProperty(
         name='Pivot Mode',
         description='Auto pivot placement mode',
@@ -7276,7 +8819,7 @@ class SXTOOLS_PT_panel(bpy.types.Panel):
 
 
     def draw(self, context):
-        objs = selection_validator(self, context)
+        objs = cached_selection(self, context)
         prefs = bpy.context.preferences.addons['sxtools'].preferences
         layout = self.layout
 
@@ -7401,6 +8944,9 @@ class SXTOOLS_PT_panel(bpy.types.Panel):
                 row_misc2.operator('sxtools.mergedown')
                 row_misc2.operator('sxtools.pastelayer', text=paste_text)
                 row_misc2.operator('sxtools.selmask', text=sel_text)
+                row_misc3 = col_misc.row(align=True)
+                row_misc3.operator('sxtools.layerundo', text='Undo Layer Edit')
+                row_misc3.operator('sxtools.layerredo', text='Redo Layer Edit')
 
                 # Fill Tools --------------------------------------------------------
                 box_fill = layout.box()
@@ -7442,6 +8988,10 @@ class SXTOOLS_PT_panel(bpy.types.Panel):
                             col_fill.prop(scene, 'occlusiondistance', slider=True, text='Ray Distance')
                             row_ground = col_fill.row(align=False)
                             row_ground.prop(scene, 'occlusiongroundplane', text='Ground Plane')
+                            row_mirrorocc = col_fill.row(align=False)
+                            row_mirrorocc.prop(sxtools, 'mirrorocclusion', text='Mirror-Aware Occlusion')
+                            if not (sxtools.xmirror or sxtools.ymirror or sxtools.zmirror) or sxtools.tiling:
+                                row_mirrorocc.enabled = False
                             row_tiling = col_fill.row(align=False)
                             row_tiling.prop(sxtools, 'tiling', text='Tiling Object')
                             row_tiling.prop(sxtools, 'tile_offset', text='Tile Offset')
@@ -7458,6 +9008,8 @@ class SXTOOLS_PT_panel(bpy.types.Panel):
                             if not sxtools.tiling:
                                 row_tiling2.enabled = False
                                 row_tiling3.enabled = False
+                            if mode == 'OBJECT':
+                                col_fill.operator('sxtools.progressiveocclusion', text='Progressive Preview')
 
                 # Directional Tool ---------------------------------------------------
                 elif scene.toolmode == 'DIR':
@@ -7727,6 +9279,8 @@ class SXTOOLS_PT_panel(bpy.types.Panel):
                         split_export.prop(sxtools, 'pivotmode', text='')
                         col_export.prop(sxtools, 'smartseparate', text='Smart Separate on Export')
                         col_export.prop(sxtools, 'lodmeshes', text='Generate LOD Meshes')
+                        if sxtools.lodmeshes:
+                            col_export.prop(sxtools, 'lodtransfer', text='Transfer LOD0 Bakes (Category)')
                         if hasattr(bpy.types, bpy.ops.object.vhacd.idname()):
                             col_export.prop(scene, 'exportcolliders', text='Generate Mesh Colliders (V-HACD)')
                             if scene.exportcolliders:
@@ -7877,7 +9431,7 @@ class SXTOOLS_PT_panel(bpy.types.Panel):
 class SXTOOLS_UL_layerlist(bpy.types.UIList):
     def draw_item(self, context, layout, data, item, icon, active_data, active_propname, index, flt_flag):
         scene = context.scene.sxtools
-        objs = selection_validator(self, context)
+        objs = cached_selection(self, context)
         hide_icon = {False: 'HIDE_ON', True: 'HIDE_OFF'}
         lock_icon = {False: 'UNLOCKED', True: 'LOCKED'}
 
@@ -7915,7 +9469,7 @@ class SXTOOLS_UL_layerlist(bpy.types.UIList):
 
 
     def filter_items(self, context, data, propname):
-        objs = selection_validator(self, context)
+        objs = cached_selection(self, context)
         if len(objs) > 0:
             flt_flags = []
             flt_neworder = []
@@ -7947,7 +9501,7 @@ class SXTOOLS_MT_piemenu(bpy.types.Menu):
 
 
     def draw(self, context):
-        objs = selection_validator(self, context)
+        objs = cached_selection(self, context)
         if len(objs) > 0:
             obj = objs[0]
 
@@ -8003,8 +9557,14 @@ class SXTOOLS_OT_selectionmonitor(bpy.types.Operator):
 
         if (len(sxglobals.masterPaletteArray) == 0) or (len(sxglobals.materialArray) == 0) or (len(sxglobals.rampDict) == 0) or (len(sxglobals.categoryDict) == 0):
             sxglobals.librariesLoaded = False
-            load_libraries(self, context)
+            if time.time() >= sxglobals.libraryRetry['next']:
+                load_libraries(self, context)
+            return {'PASS_THROUGH'}
+
+        # Nothing selection-related has changed since the last check
+        if not sxglobals.selectionDirty:
             return {'PASS_THROUGH'}
+        sxglobals.selectionDirty = False
 
         objs = selection_validator(self, context)
         if len(objs) > 0:
@@ -8013,14 +9573,17 @@ class SXTOOLS_OT_selectionmonitor(bpy.types.Operator):
                 # print('selectionmonitor: mode change')
                 sxglobals.prevMode = mode
                 sxglobals.mode = mode
+                sxglobals.prevComponentSelection = None
+                layers.clear_composite_cache(objs)
                 refresh_actives(self, context)
                 return {'PASS_THROUGH'}
 
             if (objs[0].mode == 'EDIT'):
                 objs[0].update_from_editmode()
                 mesh = objs[0].data
-                selection = [None] * len(mesh.vertices)
-                mesh.vertices.foreach_get('select', selection)
+                selectBits = np.empty(len(mesh.vertices), dtype=bool)
+                mesh.vertices.foreach_get('select', selectBits)
+                selection = (objs[0].name, len(selectBits), np.packbits(selectBits).tobytes())
                 # print('selectionmonitor: componentselection ', selection)
 
                 if selection != sxglobals.prevComponentSelection:
@@ -8053,6 +9616,8 @@ class SXTOOLS_OT_selectionmonitor(bpy.types.Operator):
     def invoke(self, context, event):
         # bpy.app.timers.register(lambda: 0.01 if 'PASS_THROUGH' in self.modal(context, event) else None)
         sxglobals.prevSelection = context.view_layer.objects.selected.keys()[:]
+        sxglobals.selectionDirty = True
+        subscribe_selection_events()
         context.window_manager.modal_handler_add(self)
         print('SX Tools: Starting selection monitor')
         return {'RUNNING_MODAL'}
@@ -8472,16 +10037,178 @@ class SXTOOLS_OT_applytool(bpy.types.Operator):
                 context.scene.sxtools.rampalpha = True
 
             if context.scene.sxtools.toolmode == 'COL':
-                tools.apply_tool(objs, layer, color=color)
+                journal.recorded(tools.apply_tool, objs, layer, color=color)
                 tools.update_recent_colors(color)
             else:
-                tools.apply_tool(objs, layer)
+                journal.recorded(tools.apply_tool, objs, layer)
+
+            sxglobals.composite = True
+            refresh_actives(self, context)
+        return {'FINISHED'}
+
+
+class SXTOOLS_OT_layerundo(bpy.types.Operator):
+    bl_idname = 'sxtools.layerundo'
+    bl_label = 'Undo Layer Edit'
+    bl_description = 'Restores the layers touched by the last SX Tools edit\nwithout a global undo step'
+
 
+    # Mesh data written in edit mode is discarded on exit
+    @classmethod
+    def poll(cls, context):
+        return (context.mode == 'OBJECT') and ((len(sxglobals.undoJournal['undo']) > 0) or (sxglobals.undoJournal['step'] is not None))
+
+
+    def invoke(self, context, event):
+        objs = journal.undo()
+        if len(objs) > 0:
+            sxglobals.composite = True
+            refresh_actives(self, context)
+        return {'FINISHED'}
+
+
+class SXTOOLS_OT_layerredo(bpy.types.Operator):
+    bl_idname = 'sxtools.layerredo'
+    bl_label = 'Redo Layer Edit'
+    bl_description = 'Reapplies the last undone SX Tools layer edit'
+
+
+    @classmethod
+    def poll(cls, context):
+        return (context.mode == 'OBJECT') and (len(sxglobals.undoJournal['redo']) > 0)
+
+
+    def invoke(self, context, event):
+        objs = journal.redo()
+        if len(objs) > 0:
             sxglobals.composite = True
             refresh_actives(self, context)
         return {'FINISHED'}
 
 
+class SXTOOLS_OT_progressiveocclusion(bpy.types.Operator):
+    bl_idname = 'sxtools.progressiveocclusion'
+    bl_label = 'Progressive Occlusion'
+    bl_description = 'Bakes occlusion in small chunks without\nblocking the UI. Press Esc to cancel\nand restore the original layer'
+    bl_options = {'UNDO'}
+
+
+    @classmethod
+    def poll(cls, context):
+        return (sxglobals.mode == 'OBJECT') and (context.scene.sxtools.toolmode == 'OCC')
+
+
+    def invoke(self, context, event):
+        objs = selection_validator(self, context)
+        if len(objs) == 0:
+            return {'CANCELLED'}
+
+        scene = context.scene.sxtools
+        self.then = time.perf_counter()
+        self.layerIndex = objs[0].sxtools.selectedlayer
+        self.queue = [obj.name for obj in objs]
+        self.orgColors = {}
+        for obj in objs:
+            layer = utils.find_layer_from_index(obj, self.layerIndex)
+            self.orgColors[obj.name] = layers.get_layer(obj, layer)
+        self.objCount = len(objs)
+        self.steps = None
+        # The whole bake, finished or cancelled, is one layer undo step
+        journal.begin_step(objs, self.layerIndex)
+        # Aim for roughly constant ray work per timer tick
+        self.chunksize = max(1, 50000 // scene.occlusionrays)
+
+        wm = context.window_manager
+        self.timer = wm.event_timer_add(0.01, window=context.window)
+        wm.modal_handler_add(self)
+        wm.progress_begin(0, 100)
+        return {'RUNNING_MODAL'}
+
+
+    def modal(self, context, event):
+        if event.type == 'ESC':
+            self.cancel(context)
+            print('SX Tools: Progressive occlusion cancelled')
+            return {'CANCELLED'}
+
+        if (event.type != 'TIMER') or (event.timer != self.timer):
+            return {'PASS_THROUGH'}
+
+        if (sxglobals.mode != 'OBJECT') or (len(self.queue) > 0 and self.queue[0] not in bpy.data.objects):
+            self.cancel(context)
+            print('SX Tools Error: Progressive occlusion interrupted')
+            return {'CANCELLED'}
+
+        if len(self.queue) == 0:
+            self.finish(context)
+            sxglobals.composite = True
+            refresh_actives(self, context)
+            now = time.perf_counter()
+            print(f'SX Tools: Progressive occlusion duration: {now-self.then} seconds')
+            return {'FINISHED'}
+
+        scene = context.scene.sxtools
+        obj = bpy.data.objects[self.queue[0]]
+        layer = utils.find_layer_from_index(obj, self.layerIndex)
+        masklayer = layer if layer.locked else None
+
+        if self.steps is None:
+            self.steps = generate.occlusion_steps(obj, scene.occlusionrays, scene.occlusionblend, scene.occlusiondistance, scene.occlusiongroundplane, masklayer, chunksize=self.chunksize)
+
+        try:
+            done, total, vert_occ_dict = next(self.steps)
+        except StopIteration:
+            # Nothing to bake on this object
+            self.steps = None
+            self.queue.pop(0)
+            return {'PASS_THROUGH'}
+
+        # Unbaked vertices have zero alpha and keep their original values
+        vert_color_dict = {}
+        for vert_id in vert_occ_dict:
+            value = vert_occ_dict[vert_id]
+            vert_color_dict[vert_id] = [value, value, value, 1.0]
+        colors = generate.vert_dict_to_loop_list(obj, vert_color_dict, 4, 4)
+        colors = generate.mask_list(obj, colors, masklayer)
+        colors = tools.blend_values(colors, self.orgColors[obj.name], scene.toolblend, scene.toolopacity)
+        layers.set_layer(obj, colors, layer)
+
+        progress = (self.objCount - len(self.queue) + done / total) / self.objCount
+        context.window_manager.progress_update(int(progress * 100))
+        context.workspace.status_text_set(f'SX Tools: Baking occlusion {obj.name} {done} / {total} vertices ({int(progress * 100)}%), Esc to cancel')
+
+        if done == total:
+            self.steps.close()
+            self.steps = None
+            self.queue.pop(0)
+
+        return {'PASS_THROUGH'}
+
+
+    def finish(self, context):
+        if self.steps is not None:
+            self.steps.close()
+            self.steps = None
+
+        wm = context.window_manager
+        wm.event_timer_remove(self.timer)
+        wm.progress_end()
+        context.workspace.status_text_set(None)
+        journal.end_step()
+
+
+    def cancel(self, context):
+        for objName in self.orgColors:
+            if objName in bpy.data.objects:
+                obj = bpy.data.objects[objName]
+                layer = utils.find_layer_from_index(obj, self.layerIndex)
+                layers.set_layer(obj, self.orgColors[objName], layer)
+        self.finish(context)
+
+        sxglobals.composite = True
+        refresh_actives(self, context)
+
+
 class SXTOOLS_OT_mergeup(bpy.types.Operator):
     bl_idname = 'sxtools.mergeup'
     bl_label = 'Merge Up'
@@ -8514,7 +10241,7 @@ class SXTOOLS_OT_mergeup(bpy.types.Operator):
             topLayer = utils.find_layer_from_index(objs[0], idx)
             listIndex = utils.find_list_index(objs[0], topLayer)
             baseLayer = utils.find_layer_from_index(objs[0], sxglobals.listItems[listIndex - 1])
-            layers.merge_layers(objs, topLayer, baseLayer, baseLayer)
+            journal.recorded(layers.merge_layers, objs, topLayer, baseLayer, baseLayer)
 
             sxglobals.composite = True
             refresh_actives(self, context)
@@ -8562,7 +10289,7 @@ class SXTOOLS_OT_mergedown(bpy.types.Operator):
             baseLayer = utils.find_layer_from_index(objs[0], idx)
             listIndex = utils.find_list_index(objs[0], baseLayer)
             topLayer = utils.find_layer_from_index(objs[0], sxglobals.listItems[listIndex + 1])
-            layers.merge_layers(objs, topLayer, baseLayer, topLayer)
+            journal.recorded(layers.merge_layers, objs, topLayer, baseLayer, topLayer)
 
             sxglobals.composite = True
             refresh_actives(self, context)
@@ -8600,7 +10327,7 @@ class SXTOOLS_OT_pastelayer(bpy.types.Operator):
             targetLayer = utils.find_layer_from_index(objs[0], idx)
 
             if event.alt and sourceLayer is not None:
-                layers.merge_layers(objs, sourceLayer, targetLayer, targetLayer)
+                journal.recorded(layers.merge_layers, objs, sourceLayer, targetLayer, targetLayer)
 
                 sxglobals.composite = True
                 refresh_actives(self, context)
@@ -8617,7 +10344,7 @@ class SXTOOLS_OT_pastelayer(bpy.types.Operator):
                 message_box('Nothing to paste!')
                 return {'FINISHED'}
             else:
-                layers.paste_layer(objs, sourceLayer, targetLayer, mode)
+                journal.recorded(layers.paste_layer, objs, sourceLayer, targetLayer, mode)
 
                 sxglobals.composite = True
                 refresh_actives(self, context)
@@ -8640,9 +10367,9 @@ class SXTOOLS_OT_clearlayers(bpy.types.Operator):
                 compLayers = utils.find_comp_layers(objs[0])
                 layer0 = utils.find_layer_from_index(objs[0], 1)
                 layer1 = utils.find_layer_from_index(objs[0], 1)
-                layers.blend_layers(objs, compLayers, layer1, layer0, uv_as_alpha=True)
+                journal.recorded(layers.blend_layers, objs, compLayers, layer1, layer0, uv_as_alpha=True)
                 for layer in compLayers:
-                    layers.clear_layers(objs, layer)
+                    journal.recorded(layers.clear_layers, objs, layer)
             else:
                 if event.shift:
                     layer = None
@@ -8650,7 +10377,7 @@ class SXTOOLS_OT_clearlayers(bpy.types.Operator):
                     idx = objs[0].sxtools.selectedlayer
                     layer = utils.find_layer_from_index(objs[0], idx)
 
-                layers.clear_layers(objs, layer)
+                journal.recorded(layers.clear_layers, objs, layer)
 
             utils.mode_manager(objs, revert=True, mode_id='clearlayers')
             sxglobals.composite = True
@@ -8731,7 +10458,7 @@ class SXTOOLS_OT_applypalette(bpy.types.Operator):
         objs = selection_validator(self, context)
         if len(objs) > 0:
             palette = self.label
-            tools.apply_palette(objs, palette)
+            journal.recorded(tools.apply_palette, objs, palette)
 
             if not bpy.app.background:
                 sxglobals.composite = True
@@ -8754,7 +10481,7 @@ class SXTOOLS_OT_applymaterial(bpy.types.Operator):
             material = self.label
             idx = objs[0].sxtools.selectedlayer
             layer = utils.find_layer_from_index(objs[0], idx)
-            tools.apply_material(objs, layer, material)
+            journal.recorded(tools.apply_material, objs, layer, material)
 
             sxglobals.composite = True
             refresh_actives(self, context)
@@ -8851,8 +10578,8 @@ class SXTOOLS_OT_generatemasks(bpy.types.Operator):
     def invoke(self, context, event):
         objs = selection_validator(self, context)
         if len(objs) > 0:
-            layers.generate_masks(objs)
-            layers.flatten_alphas(objs)
+            journal.recorded(layers.generate_masks, objs)
+            journal.recorded(layers.flatten_alphas, objs)
         return {'FINISHED'}
 
 
@@ -9119,8 +10846,8 @@ class SXTOOLS_OT_resetoverlay(bpy.types.Operator):
             obj.sxlayers['occlusion'].defaultColor = (1.0, 1.0, 1.0, 1.0)
             obj.sxlayers['overlay'].defaultColor = (0.5, 0.5, 0.5, 1.0)
 
-        layers.clear_layers(objs, objs[0].sxlayers['overlay'])
-        layers.clear_layers(objs, objs[0].sxlayers['occlusion'])
+        journal.recorded(layers.clear_layers, objs, objs[0].sxlayers['overlay'])
+        journal.recorded(layers.clear_layers, objs, objs[0].sxlayers['occlusion'])
         # bpy.context.view_layer.update()
         sxglobals.composite = True
         refresh_actives(self, context)
@@ -9251,33 +10978,26 @@ class SXTOOLS_OT_catalogue_add(bpy.types.Operator):
 
     assetTags: bpy.props.StringProperty(name='Tags')
 
-    def load_asset_data(self, catalogue_path):
+    def update_asset_data(self, catalogue_path, modify):
         if len(catalogue_path) > 0:
             try:
-                with open(catalogue_path, 'r') as input:
-                    temp_dict = {}
-                    temp_dict = json.load(input)
-                    input.close()
-                return True, temp_dict
+                result = catalogue.update(catalogue_path, modify)
             except ValueError:
                 message_box('Invalid Asset Catalogue file.', 'SX Tools Error', 'ERROR')
-                return False, None
+                return False
             except IOError:
                 message_box('Asset Catalogue file not found!', 'SX Tools Error', 'ERROR')
-                return False, None
-        else:
-            message_box('Invalid catalogue path', 'SX Tools Error', 'ERROR')
-            return False, None
-
+                return False
 
-    def save_asset_data(self, catalogue_path, data_dict):
-        if len(catalogue_path) > 0:
-            with open(catalogue_path, 'w') as output:
-                json.dump(data_dict, output, indent=4)
-                output.close()
-            message_box(catalogue_path + ' saved')
+            if result is None:
+                message_box('Asset Catalogue is locked by another session.', 'SX Tools Error', 'ERROR')
+                return False
+            elif result:
+                message_box(catalogue_path + ' saved')
+            return result
         else:
             message_box('Invalid catalogue path', 'SX Tools Error', 'ERROR')
+            return False
 
 
     def invoke(self, context, event):
@@ -9292,13 +11012,9 @@ class SXTOOLS_OT_catalogue_add(bpy.types.Operator):
 
 
     def execute(self, context):
-        catalogue_dict = {}
         asset_dict = {}
         prefs = context.preferences.addons['sxtools'].preferences
         objs = selection_validator(self, context)
-        result, catalogue_dict = self.load_asset_data(prefs.cataloguepath)
-        if not result:
-            return {'FINISHED'}
 
         for obj in objs:
             obj['sxToolsVersion'] = 'SX Tools for Blender ' + str(sys.modules['sxtools'].bl_info.get('version'))
@@ -9332,25 +11048,27 @@ class SXTOOLS_OT_catalogue_add(bpy.types.Operator):
 
         asset_path = os.path.split(prefs.cataloguepath)[0]
         prefix = os.path.commonpath([asset_path, file_path])
-        file_rel_path = os.path.relpath(file_path, asset_path)
 
         # Check if file is located under the specified folder
         if not os.path.samefile(asset_path, prefix):
             message_box('File not located under asset folders!', 'SX Tools Error', 'ERROR')
             return {'FINISHED'}
 
-        # Check if the Catalogue already contains the asset category
-        if asset_category not in catalogue_dict:
-            catalogue_dict[asset_category] = {}
-
-        # Save entry with a platform-independent path separator
         asset_dict['tags'] = asset_tags
         asset_dict['objects'] = groups
         asset_dict['cost'] = cost
         asset_dict['revision'] = revision
 
-        catalogue_dict[asset_category][file_rel_path.replace(os.path.sep, '//')] = asset_dict
-        self.save_asset_data(prefs.cataloguepath, catalogue_dict)
+        def add_entry(catalogue_dict, index):
+            # Check if the Catalogue already contains the asset category
+            if asset_category not in catalogue_dict:
+                catalogue_dict[asset_category] = {}
+
+            # Save entry with a platform-independent path separator
+            catalogue_dict[asset_category][catalogue.entry_key(prefs.cataloguepath, file_path)] = asset_dict
+            return True
+
+        self.update_asset_data(prefs.cataloguepath, add_entry)
         return {'FINISHED'}
 
 
@@ -9361,41 +11079,30 @@ class SXTOOLS_OT_catalogue_remove(bpy.types.Operator):
     bl_options = {'UNDO'}
 
 
-    def load_asset_data(self, catalogue_path):
+    def update_asset_data(self, catalogue_path, modify):
         if len(catalogue_path) > 0:
             try:
-                with open(catalogue_path, 'r') as input:
-                    temp_dict = {}
-                    temp_dict = json.load(input)
-                    input.close()
-                return True, temp_dict
+                result = catalogue.update(catalogue_path, modify)
             except ValueError:
                 message_box('Invalid Asset Catalogue file.', 'SX Tools Error', 'ERROR')
-                return False, None
+                return False
             except IOError:
                 message_box('Asset Catalogue file not found!', 'SX Tools Error', 'ERROR')
-                return False, None
-        else:
-            message_box('Invalid catalogue path', 'SX Tools Error', 'ERROR')
-            return False, None
-
+                return False
 
-    def save_asset_data(self, catalogue_path, data_dict):
-        if len(catalogue_path) > 0:
-            with open(catalogue_path, 'w') as output:
-                json.dump(data_dict, output, indent=4)
-                output.close()
-            message_box(catalogue_path + ' saved')
+            if result is None:
+                message_box('Asset Catalogue is locked by another session.', 'SX Tools Error', 'ERROR')
+                return False
+            elif result:
+                message_box(catalogue_path + ' saved')
+            return result
         else:
             message_box('Invalid catalogue path', 'SX Tools Error', 'ERROR')
+            return False
 
 
     def invoke(self, context, event):
         prefs = context.preferences.addons['sxtools'].preferences
-        result, asset_dict = self.load_asset_data(prefs.cataloguepath)
-        if not result:
-            return {'FINISHED'}
-
         file_path = bpy.data.filepath
         if len(file_path) == 0:
             message_box('Current file not saved!', 'SX Tools Error', 'ERROR')
@@ -9405,16 +11112,17 @@ class SXTOOLS_OT_catalogue_remove(bpy.types.Operator):
         paths = [asset_path, file_path]
         prefix = os.path.commonpath(paths)
 
-        file_rel_path = os.path.relpath(file_path, asset_path)
-
         if not os.path.samefile(asset_path, prefix):
             message_box('File not located under asset folders!', 'SX Tools Error', 'ERROR')
             return {'FINISHED'}
 
-        for asset_category in asset_dict:
-            asset_dict[asset_category].pop(file_rel_path.replace(os.path.sep, '//'), None)
+        def remove_entries(asset_dict, index):
+            entries = index.get(catalogue.normalize(file_path), [])
+            for asset_category, key in entries:
+                asset_dict[asset_category].pop(key, None)
+            return len(entries) > 0
 
-        self.save_asset_data(prefs.cataloguepath, asset_dict)
+        self.update_asset_data(prefs.cataloguepath, remove_entries)
         return {'FINISHED'}
 
 
@@ -9539,10 +11247,12 @@ class SXTOOLS_OT_macro(bpy.types.Operator):
 # ------------------------------------------------------------------------
 sxglobals = SXTOOLS_sxglobals()
 files = SXTOOLS_files()
+catalogue = SXTOOLS_catalogue()
 convert = SXTOOLS_convert()
 utils = SXTOOLS_utils()
 generate = SXTOOLS_generate()
 layers = SXTOOLS_layers()
+journal = SXTOOLS_journal()
 setup = SXTOOLS_setup()
 tools = SXTOOLS_tools()
 validate = SXTOOLS_validate()
@@ -9564,6 +11274,9 @@ classes = (
     SXTOOLS_OT_keymonitor,
     SXTOOLS_OT_scenesetup,
     SXTOOLS_OT_applytool,
+    SXTOOLS_OT_layerundo,
+    SXTOOLS_OT_layerredo,
+    SXTOOLS_OT_progressiveocclusion,
     SXTOOLS_OT_addramp,
     SXTOOLS_OT_delramp,
     SXTOOLS_OT_addpalettecategory,
@@ -9627,6 +11340,9 @@ def register():
     bpy.types.Scene.sxmaterials = bpy.props.CollectionProperty(type=SXTOOLS_material)
 
     bpy.app.handlers.load_post.append(load_post_handler)
+    bpy.app.handlers.depsgraph_update_post.append(depsgraph_update_handler)
+    bpy.app.handlers.undo_post.append(undo_post_handler)
+    bpy.app.handlers.redo_post.append(undo_post_handler)
     bpy.app.handlers.save_pre.append(save_pre_handler)
     bpy.app.handlers.save_post.append(save_post_handler)
 
@@ -9654,9 +11370,18 @@ def unregister():
     del bpy.types.Scene.sxmaterials
 
     bpy.app.handlers.load_post.remove(load_post_handler)
+    bpy.app.handlers.depsgraph_update_post.remove(depsgraph_update_handler)
+    bpy.msgbus.clear_by_owner(sxglobals.msgbusOwner)
+    bpy.app.handlers.undo_post.remove(undo_post_handler)
+    bpy.app.handlers.redo_post.remove(undo_post_handler)
     bpy.app.handlers.save_pre.remove(save_pre_handler)
     bpy.app.handlers.save_post.remove(save_post_handler)
 
+    for timer in (close_journal_step, run_scheduled_refresh):
+        if bpy.app.timers.is_registered(timer):
+            bpy.app.timers.unregister(timer)
+    sxglobals.refreshQueue.update({'scheduled': False, 'actives': False, 'composite': False, 'tasks': {}})
+
     wm = bpy.context.window_manager
     kc = wm.keyconfigs.addon
     if kc: